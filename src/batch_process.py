@@ -0,0 +1,239 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from utils.frame_sampler import KEYFRAMES, MODES, SECONDS, FrameSampler, keyframes_supported, source_info
+from utils.report_generator import ReportGenerator, frame_metrics, is_defect_object
+from utils.result_store import ResultStore
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+
+# Движок создаётся один раз на процесс пула (см. _init_worker)
+_engine = None
+
+
+def _init_worker(config_path, threads_per_worker):
+    global _engine
+    cv2.setNumThreads(threads_per_worker)
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    from inference.engine import InferenceEngine
+    from utils.config import Config
+    _engine = InferenceEngine(Config(config_path))
+
+
+def collect_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTS):
+                    videos.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Пропущен несуществующий путь: {path}")
+    return videos
+
+
+def split_ranges(video_path, chunk_size):
+    """Делит видео на диапазоны кадров [start, end). end=None — читать до конца."""
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total <= 0:
+        return [(0, None)]
+    starts = list(range(0, total, chunk_size))
+    # Контейнер может занижать число кадров — последний фрагмент читается до конца файла
+    return [(start, start + chunk_size) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+def process_chunk(video_path, start, end, defect_threshold, sampler_args):
+    # Процесс пула обрабатывает фрагменты разных видео: треки, гейт и кэш прошлого кадра не переносятся
+    _engine.reset_tracking()
+    cap = cv2.VideoCapture(video_path)
+    sampler = FrameSampler(*sampler_args)
+    frames = []
+    # Декодируются только кадры, выбранные сэмплером; шаг отсчитывается от начала
+    # видео, поэтому границы фрагментов не влияют на выбор кадров
+    for frame_idx, ts, frame in sampler.frames(cap, cap.get(cv2.CAP_PROP_FPS), start, end):
+        results = _engine.infer(frame)
+        # В отчёт попадают скриншоты только кадров с дефектами — их и передаём (в JPEG)
+        jpeg = None
+        if any(is_defect_object(obj, defect_threshold) for obj in results):
+            vis = _engine.draw_results(frame, results, draw_heatmap=True)
+            ok, buf = cv2.imencode(".jpg", vis)
+            jpeg = buf.tobytes() if ok else None
+        frames.append(({"frame_idx": frame_idx, "objects": results, **source_info(frame_idx, ts)}, jpeg))
+    cap.release()
+    return video_path, start, frames
+
+
+class VideoOutput:
+    """Результаты одного видео. Фрагменты приходят из пула в произвольном порядке;
+    как только готов следующий по порядку, он сразу дописывается в JSONL и
+    потоковый Excel-отчёт, а кадры фрагмента освобождаются. Файлы
+    открываются при записи первого кадра, а не при создании объекта."""
+
+    def __init__(self, args, video_path, chunk_starts):
+        self.args = args
+        self.video_name = os.path.splitext(os.path.basename(video_path))[0]
+        self.chunk_starts = sorted(chunk_starts)
+        self.pending = {}
+        self.frames_written = 0
+        self.parquet_results = ResultStore() if args.format in ("parquet", "both") else None
+        self.jsonl = None
+        self.report = None
+        self.defect_frames = 0
+
+    @property
+    def opened(self):
+        return self.report is not None
+
+    def _open(self):
+        args = self.args
+        if args.format in ("jsonl", "both"):
+            self.jsonl = open(os.path.join(args.output_dir, f"{self.video_name}_results.jsonl"), "w", encoding="utf-8")
+        self.report = ReportGenerator(report_dir=args.output_dir).open_stream(self.video_name, args.defect_threshold)
+
+    def add_chunk(self, start, frames):
+        self.pending[start] = frames
+        while self.chunk_starts and self.chunk_starts[0] in self.pending:
+            for frame_result, jpeg in self.pending.pop(self.chunk_starts.pop(0)):
+                self._write_frame(frame_result, jpeg)
+        return not self.chunk_starts
+
+    def _write_frame(self, frame_result, jpeg):
+        # frame_idx — порядковый номер обработанного кадра, как в GUI; положение
+        # в видео — source_frame_idx (без прореживания они совпадают)
+        frame_result["frame_idx"] = self.frames_written
+        if not self.opened:
+            self._open()
+        if self.jsonl is not None:
+            self.jsonl.write(json.dumps(frame_result, ensure_ascii=False) + "\n")
+        if self.parquet_results is not None:
+            self.parquet_results.append(frame_result)
+        if any(is_defect_object(obj, self.args.defect_threshold) for obj in frame_result["objects"]):
+            self.defect_frames += 1
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR) if jpeg else None
+        self.report.add_frame(frame_result, image)
+        self.frames_written += 1
+
+    def close(self):
+        if not self.opened:
+            # Видео без кадров — пустой отчёт всё равно создаётся
+            self._open()
+        if self.jsonl is not None:
+            self.jsonl.close()
+        if self.parquet_results is not None:
+            parquet_path = os.path.join(self.args.output_dir, f"{self.video_name}_results.parquet")
+            try:
+                self.parquet_results.save(parquet_path)
+            except ImportError as e:
+                if self.jsonl is not None:
+                    print(f"Parquet недоступен ({e}), сохранён только JSONL")
+                else:
+                    print(f"Parquet недоступен ({e}), результаты сохраняются в JSONL")
+                    jsonl_path = os.path.join(self.args.output_dir, f"{self.video_name}_results.jsonl")
+                    with open(jsonl_path, "w", encoding="utf-8") as f:
+                        for frame_result in self.parquet_results:
+                            f.write(json.dumps(frame_result, ensure_ascii=False) + "\n")
+        self.report.close(frame_metrics(self.frames_written, self.defect_frames, self.args.defect_threshold))
+        return self.frames_written
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    from utils.config import Config
+    config = Config(args.config)
+    if args.defect_threshold is None:
+        args.defect_threshold = float(config.get("defect_threshold", 0.7))
+    sampler = FrameSampler.from_config(config)
+    sampler_args = (
+        args.sample_mode or sampler.mode,
+        args.every_n or sampler.every_n,
+        args.every_s or sampler.every_s,
+        sampler.seek_min_gap,
+    )
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("Нет видео для обработки")
+        return
+
+    tasks = []
+    outputs = {}
+    for video_path in videos:
+        # Файлы результатов откроются при первом готовом кадре видео (VideoOutput._open)
+        video_sampler_args = sampler_args
+        if sampler_args[0] == KEYFRAMES and not keyframes_supported(video_path):
+            # Фрагменты начинаются не с ключевого кадра и сами поддержку не проверят;
+            # решение своё для каждого файла — контейнеры и кодеки в списке могут различаться
+            print(f"{video_path}: бэкенд не сообщает ключевые кадры, прореживание по времени")
+            video_sampler_args = (SECONDS,) + sampler_args[1:]
+        ranges = split_ranges(video_path, args.chunk_size)
+        tasks.extend((video_path, start, end, video_sampler_args) for start, end in ranges)
+        outputs[video_path] = VideoOutput(args, video_path, [start for start, _ in ranges])
+    print(f"Видео: {len(videos)}, фрагментов: {len(tasks)}, процессов: {args.workers}, прореживание: {sampler_args[0]}")
+
+    t0 = time.time()
+    total_frames = 0
+    # spawn: дочерние процессы не наследуют состояние torch/OpenCV родителя
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(args.config, args.threads_per_worker),
+    ) as pool:
+        futures = [
+            pool.submit(process_chunk, video_path, start, end, args.defect_threshold, video_sampler_args)
+            for video_path, start, end, video_sampler_args in tasks
+        ]
+        try:
+            for fut in as_completed(futures):
+                video_path, start, frames = fut.result()
+                if outputs[video_path].add_chunk(start, frames):
+                    n = outputs.pop(video_path).close()
+                    total_frames += n
+                    print(f"Готово: {video_path} ({n} кадров)")
+        finally:
+            # При ошибке уже начатые отчёты закрываются с тем, что успели записать
+            for video_path, output in outputs.items():
+                if not output.opened:
+                    continue
+                try:
+                    n = output.close()
+                    print(f"Не завершено: {video_path} (записано {n} кадров)")
+                except Exception as e:
+                    print(f"Ошибка закрытия результатов {video_path}: {e}")
+            for fut in futures:
+                fut.cancel()
+
+    elapsed = time.time() - t0
+    print(f"Обработано кадров: {total_frames} за {elapsed:.1f} с ({total_frames / (elapsed or 1):.1f} кадр/с)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный анализ видео без GUI")
+    parser.add_argument('inputs', nargs='+', help='Видеофайлы или директории с видео')
+    parser.add_argument('--config', type=str, default='config.json')
+    parser.add_argument('--output_dir', type=str, default='reports', help='Куда сохранять результаты и отчёты')
+    parser.add_argument('--format', choices=['jsonl', 'parquet', 'both'], default='jsonl', help='Формат покадровых результатов')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2), help='Число процессов')
+    parser.add_argument('--threads_per_worker', type=int, default=2, help='Потоков torch/OpenCV на процесс')
+    parser.add_argument('--chunk_size', type=int, default=500, help='Кадров в одном фрагменте видео')
+    parser.add_argument('--defect_threshold', type=float, default=None, help='Порог дефекта для отчёта (по умолчанию из config.json)')
+    parser.add_argument('--sample_mode', choices=list(MODES), default=None, help='Прореживание кадров (по умолчанию sampler_mode из config.json)')
+    parser.add_argument('--every_n', type=int, default=None, help='Для nth: обрабатывать каждый N-й кадр')
+    parser.add_argument('--every_s', type=float, default=None, help='Для seconds: обрабатывать кадр раз в T секунд')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from gui.display import DisplayConverter
+from inference.engine import DEFAULT_CLASSIFIER_ROUTING, InferenceEngine
+from inference.model_cache import get_model
+from utils.config import Config
+from utils.report_generator import ReportGenerator
+
+
+class BenchEngine(InferenceEngine):
+    """Движок для бенчмарка: веса детектора не поставляются с репозиторием,
+    поэтому при их отсутствии стадия детекции пропускается, а остальные
+    стадии работают на синтетических детекциях."""
+
+    def _load_models(self, spec):
+        if os.path.exists(spec["detector_ckpt"]):
+            return super()._load_models(spec)
+        classifiers = {
+            name: get_model(ckpt, "classify", spec["backend"], spec["device"], spec["precision"], spec["int8_min_agreement"])
+            for name, ckpt in spec["classifier_ckpts"].items()
+        }
+        return spec, (None, threading.Lock()), classifiers
+
+
+def synthetic_frame(width, height, rng):
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def synthetic_detections(width, height, count, rng):
+    classes = list(DEFAULT_CLASSIFIER_ROUTING)
+    detections = []
+    for _ in range(count):
+        w, h = rng.integers(40, 300, size=2)
+        x1 = int(rng.integers(0, width - w))
+        y1 = int(rng.integers(0, height - h))
+        detections.append(([x1, y1, x1 + int(w), y1 + int(h)], classes[int(rng.integers(len(classes)))], 0.95))
+    return detections
+
+
+def synthetic_results(detections):
+    return [
+        {
+            'bbox': bbox,
+            'object_class': obj_class,
+            'object_conf': conf,
+            'defect_class': "good" if i % 2 else "rust",
+            'defect_conf': 0.9,
+        }
+        for i, (bbox, obj_class, conf) in enumerate(detections)
+    ]
+
+
+def measure(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times = np.array(times)
+    return {
+        "median_ms": float(np.median(times)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "mean_ms": float(times.mean()),
+        "n": int(repeat),
+    }
+
+
+def crop_rois(frame, detections):
+    rois = []
+    for bbox, _, _ in detections:
+        x1, y1, x2, y2 = bbox
+        roi = frame[y1:y2, x1:x2]
+        if roi.size == 0 or roi.shape[0] < 10 or roi.shape[1] < 10:
+            continue
+        rois.append(roi)
+    return rois
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    config = Config(args.config)
+    # Изменения только в памяти — config.json не перезаписывается
+    config.config.update({
+        "classifier_ckpt": args.classifier,
+        "device": "cpu",
+        "backend": args.backend,
+        "classifier_batch_size": args.classifier_batch_size,
+        "tracking_enabled": False,
+        "gating_enabled": False,
+        "tiling_enabled": False,
+    })
+    engine = BenchEngine(config)
+
+    frame = synthetic_frame(args.width, args.height, rng)
+    detections = synthetic_detections(args.width, args.height, args.detections, rng)
+    rois = crop_rois(frame, detections)
+    results = {}
+
+    if engine.detector is not None:
+        results["detector"] = measure(lambda: engine.detect([frame]), args.repeat, args.warmup)
+    else:
+        print(f"Детектор не найден ({config.get('detector_ckpt')}), стадия detector пропущена")
+
+    results["crop"] = measure(lambda: crop_rois(frame, detections), args.repeat, args.warmup)
+    results["classifier"] = measure(lambda: engine.classify_rois(rois), args.repeat, args.warmup)
+    results["classify_total"] = measure(lambda: engine.classify([frame], [detections]), args.repeat, args.warmup)
+
+    # Фильтрация отдельно от модели: классификатор подменяется готовыми ответами
+    predictions = engine.classify_rois(rois)
+    engine.classify_rois = lambda batch, classifier=None, batch_size=None: predictions[:len(batch)]
+    results["filtering"] = measure(lambda: engine.classify([frame], [detections]), args.repeat, args.warmup)
+    filtered = engine.classify([frame], [detections])[0]
+    del engine.classify_rois
+
+    # Для отрисовки и отчёта берём все детекции: после фильтрации синтетического
+    # кадра их может не остаться, а время отрисовки зависит от их числа
+    frame_results = synthetic_results(detections)
+    results["draw_results"] = measure(
+        lambda: engine.draw_results(frame, frame_results, draw_heatmap=True), args.repeat, args.warmup
+    )
+    converter = DisplayConverter()
+    results["display_convert"] = measure(
+        lambda: converter.convert(frame, (args.display_width, args.display_height)), args.repeat, args.warmup
+    )
+
+    vis = engine.draw_results(frame, frame_results, draw_heatmap=True)
+    report_frames = [{"frame_idx": i, "objects": frame_results} for i in range(args.report_frames)]
+    with tempfile.TemporaryDirectory() as tmp:
+        gen = ReportGenerator(report_dir=tmp)
+        results["save_report"] = measure(
+            lambda: gen.save_report(report_frames, video_name="bench", frame_images=[vis] * len(report_frames)),
+            max(1, args.repeat // 10),
+            0,
+        )
+
+    return {
+        "meta": {
+            "frame": [args.width, args.height],
+            "detections": args.detections,
+            "rois": len(rois),
+            "results_after_filter": len(filtered),
+            "report_frames": args.report_frames,
+            "classifier": args.classifier,
+            "backend": args.backend,
+            "classifier_batch_size": args.classifier_batch_size,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Возвращает список стадий, у которых медиана хуже базовой больше чем на tolerance."""
+    regressions = []
+    print(f"{'стадия':<18}{'база, мс':>12}{'сейчас, мс':>12}{'изм.':>9}")
+    for stage, cur in current["results"].items():
+        base = baseline.get("results", {}).get(stage)
+        if base is None:
+            print(f"{stage:<18}{'—':>12}{cur['median_ms']:>12.2f}{'':>9}")
+            continue
+        ratio = cur["median_ms"] / max(base["median_ms"], 1e-9)
+        flag = ""
+        if ratio > 1.0 + tolerance:
+            regressions.append(stage)
+            flag = "  РЕГРЕССИЯ"
+        print(f"{stage:<18}{base['median_ms']:>12.2f}{cur['median_ms']:>12.2f}{(ratio - 1) * 100:>8.1f}%{flag}")
+    return regressions
+
+
+def main(args):
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Результаты сохранены: {args.output}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Регрессии производительности: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих путей инференса, отрисовки и отчётов (CPU)")
+    parser.add_argument('--config', type=str, default='config.json')
+    parser.add_argument('--classifier', type=str, default='checkpoints/classifier/weights/best.pt')
+    parser.add_argument('--backend', type=str, default='torch', help='torch / onnxruntime / openvino')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--detections', type=int, default=30, help='Число синтетических детекций на кадре')
+    parser.add_argument('--classifier_batch_size', type=int, default=32)
+    parser.add_argument('--display_width', type=int, default=960)
+    parser.add_argument('--display_height', type=int, default=540)
+    parser.add_argument('--report_frames', type=int, default=50, help='Кадров в отчёте для save_report')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help='Куда сохранить JSON с результатами')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Допустимое замедление медианы (доля)')
+    args = parser.parse_args()
+    main(args)
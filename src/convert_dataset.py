@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LINK_MODES = ("copy", "hardlink", "symlink")
+
+
+# COCO bbox: [x_min, y_min, width, height]
+def coco2yolo(bbox, img_w, img_h):
+    x, y, w, h = bbox
+    x_center = (x + w / 2) / img_w
+    y_center = (y + h / 2) / img_h
+    w /= img_w
+    h /= img_h
+    return x_center, y_center, w, h
+
+
+class Progress:
+    """Счётчики для отчёта о скорости конвертации."""
+
+    def __init__(self, name):
+        self.name = name
+        self.done = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.t0 = time.time()
+
+    def add(self, written, size=0):
+        if written:
+            self.done += 1
+            self.bytes += size
+        else:
+            self.skipped += 1
+
+    def report(self):
+        elapsed = max(time.time() - self.t0, 1e-6)
+        total = self.done + self.skipped
+        print(
+            f"{self.name}: обработано {self.done}, пропущено актуальных {self.skipped} "
+            f"за {elapsed:.1f} с ({total / elapsed:.1f} файлов/с, {self.bytes / elapsed / 2**20:.1f} МБ/с)"
+        )
+
+
+# --- Детекция: COCO → YOLO ---
+
+def _coco_reader(json_path):
+    """Функция key -> итератор элементов images/annotations из COCO JSON.
+    С ijson каждый раздел читается из файла потоково, без него файл
+    разбирается один раз (json.load) и оба раздела берутся из него."""
+    try:
+        import ijson
+    except ImportError:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return lambda key: iter(data[key])
+
+    def read(key):
+        with open(json_path, 'rb') as f:
+            yield from ijson.items(f, f"{key}.item", use_float=True)
+    return read
+
+
+def coco_splits(root):
+    ann_dir = os.path.join(root, "annotations")
+    if not os.path.isdir(ann_dir):
+        return []
+    return sorted(
+        name[len("instances_"):-len(".json")]
+        for name in os.listdir(ann_dir)
+        if name.startswith("instances_") and name.endswith(".json")
+    )
+
+
+def _write_label(label_path, text, source_mtime, force):
+    # Файл разметки актуален, если он новее исходного JSON
+    if not force and os.path.exists(label_path) and os.path.getmtime(label_path) >= source_mtime:
+        return False, 0
+    with open(label_path, 'w') as f:
+        f.write(text)
+    return True, len(text)
+
+
+def _remove_stale_labels(label_dir, expected):
+    removed = 0
+    for name in os.listdir(label_dir):
+        path = os.path.join(label_dir, name)
+        if name.endswith('.txt') and path not in expected:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def convert_det_split(root, split, pool, force=False):
+    json_path = os.path.join(root, "annotations", f"instances_{split}.json")
+    label_dir = os.path.join(root, split, "labels")
+    os.makedirs(label_dir, exist_ok=True)
+    source_mtime = os.path.getmtime(json_path)
+    read_coco = _coco_reader(json_path)
+
+    # Из images нужны только имя файла и размер
+    images = {
+        img['id']: (img['file_name'], img['width'], img['height'])
+        for img in read_coco('images')
+    }
+    label_lines = {}
+    for ann in read_coco('annotations'):
+        _, img_w, img_h = images[ann['image_id']]
+        cat_id = ann['category_id'] - 1  # YOLO: class_id с 0, COCO: с 1
+        x_center, y_center, w, h = coco2yolo(ann['bbox'], img_w, img_h)
+        label_lines.setdefault(ann['image_id'], []).append(
+            f"{cat_id} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}"
+        )
+
+    label_paths = {
+        img_id: os.path.join(label_dir, os.path.splitext(images[img_id][0])[0] + '.txt')
+        for img_id in label_lines
+    }
+    progress = Progress(f"det/{split}")
+    futures = [
+        pool.submit(_write_label, label_paths[img_id], '\n'.join(lines), source_mtime, force)
+        for img_id, lines in label_lines.items()
+    ]
+    for fut in futures:
+        progress.add(*fut.result())
+    # Метки изображений, которых больше нет в разметке (или у которых не осталось объектов)
+    removed = _remove_stale_labels(label_dir, set(label_paths.values()))
+    progress.report()
+    if removed:
+        print(f"det/{split}: удалено устаревших меток {removed}")
+    return progress
+
+
+
+# --- Классификация: объект/split/дефект → split/объект_дефект ---
+
+def _is_up_to_date(src, dst, mode):
+    if not os.path.lexists(dst):
+        return False
+    if os.path.islink(dst):
+        return mode == "symlink" and os.readlink(dst) == src
+    if mode == "symlink":
+        return False
+    # lstat: сравниваем сам файл назначения, а не то, на что он мог бы ссылаться
+    src_stat, dst_stat = os.stat(src), os.lstat(dst)
+    if mode == "hardlink" and (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    return src_stat.st_size == dst_stat.st_size and dst_stat.st_mtime >= src_stat.st_mtime
+
+
+def _place_file(src, dst, mode, force):
+    if not force and _is_up_to_date(src, dst, mode):
+        return False, 0
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == "symlink":
+        os.symlink(src, dst)
+        return True, 0
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return True, 0
+        except OSError:
+            # Другой диск или ФС без жёстких ссылок — копируем
+            pass
+    shutil.copy2(src, dst)
+    return True, os.path.getsize(dst)
+
+
+def cls_tasks(src_dir, dst_dir, splits=None):
+    """Пары (src, dst) для всех изображений; dst = dst_dir/split/объект_дефект/файл."""
+    dst_abs = os.path.abspath(dst_dir)
+    for obj_type in sorted(os.listdir(src_dir)):
+        obj_path = os.path.join(src_dir, obj_type)
+        # Выходная папка может лежать внутри исходной — не обходим её
+        if not os.path.isdir(obj_path) or os.path.abspath(obj_path) == dst_abs:
+            continue
+        for split in sorted(os.listdir(obj_path)):
+            split_path = os.path.join(obj_path, split)
+            if not os.path.isdir(split_path) or (splits and split not in splits):
+                continue
+            for defect_type in sorted(os.listdir(split_path)):
+                defect_path = os.path.join(split_path, defect_type)
+                if not os.path.isdir(defect_path):
+                    continue
+                # Новый класс: objtype_defect
+                target_dir = os.path.join(dst_dir, split, f"{obj_type}_{defect_type}")
+                os.makedirs(target_dir, exist_ok=True)
+                for img in os.listdir(defect_path):
+                    yield os.path.abspath(os.path.join(defect_path, img)), os.path.join(target_dir, img)
+
+
+def convert_cls(src_dir, dst_dir, pool, mode="hardlink", splits=None, force=False):
+    progress = Progress(f"cls ({mode})")
+    futures = [
+        pool.submit(_place_file, src, dst, mode, force)
+        for src, dst in cls_tasks(src_dir, dst_dir, splits)
+    ]
+    for fut in futures:
+        progress.add(*fut.result())
+    progress.report()
+    return progress
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Подготовка датасетов InsPLAD для обучения YOLO")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4), help='Потоков записи файлов')
+    common.add_argument('--force', action='store_true', help='Перезаписать и актуальные файлы')
+    sub = parser.add_subparsers(dest='task', required=True)
+
+    det = sub.add_parser('det', parents=[common], help='COCO-разметка детекции → YOLO-метки')
+    det.add_argument('--root', type=str, default='InsPLAD-det')
+    det.add_argument('--splits', nargs='*', default=None, help='По умолчанию — все annotations/instances_*.json')
+
+    cls = sub.add_parser('cls', parents=[common], help='Дефекты по объектам → классы объект_дефект')
+    cls.add_argument('--src', type=str, default='InsPLAD-fault/supervised_fault_classification/defect_supervised')
+    cls.add_argument('--dst', type=str, default='InsPLAD-fault/supervised_fault_classification/defect_supervised/all_classes')
+    cls.add_argument('--splits', nargs='*', default=None, help='По умолчанию — все найденные')
+    cls.add_argument('--mode', choices=LINK_MODES, default='hardlink', help='Как класть изображения в выходную папку')
+    return parser.parse_args(argv)
+
+
+def main(args):
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        if args.task == 'det':
+            splits = args.splits or coco_splits(args.root)
+            if not splits:
+                print(f"Не найдены аннотации в {os.path.join(args.root, 'annotations')}")
+                return
+            for split in splits:
+                convert_det_split(args.root, split, pool, args.force)
+        else:
+            convert_cls(args.src, args.dst, pool, args.mode, args.splits, args.force)
+    print(f"Готово за {time.time() - t0:.1f} с")
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from PyQt5 import QtCore
+
+from inference.scheduler import is_live_source
+from utils.frame_sampler import FrameSampler, source_info
+from utils.metrics import METRICS
+
+
+class CaptureThread(QtCore.QThread):
+    """Чтение видео в отдельном потоке.
+
+    Файлы воспроизводятся в темпе времени кадров источника. Живые потоки
+    (RTSP и т.п.) читаются непрерывно (grab), а потребителю отдаётся
+    только самый свежий кадр — буфер OpenCV не накапливает задержку.
+    Новый кадр не отправляется, пока потребитель не подтвердил предыдущий
+    (frame_consumed), поэтому очередь сигналов в GUI не растёт. Кадр
+    передаётся без копирования: retrieve() каждый раз возвращает новый
+    массив. sampler (FrameSampler) задаёт прореживание: невыбранные кадры
+    не переводятся в BGR, а в файлах длинные пропуски делаются позиционированием.
+    Вместе с кадром передаётся его номер и время в источнике (source_info).
+    """
+
+    frame_captured = QtCore.pyqtSignal(np.ndarray, dict)
+
+    def __init__(self, source, parent=None, sampler=None):
+        super().__init__(parent)
+        self.source = source
+        self.live = is_live_source(source)
+        self.sampler = sampler or FrameSampler()
+        self.fps = 0.0
+        self.frames_dropped = 0
+        self._running = True
+        self._consumer_free = threading.Event()
+        self._consumer_free.set()
+        # Необязательный обработчик в потоке захвата; если вернул True,
+        # кадр обработан на месте и сигнал в GUI не отправляется
+        self.frame_callback = None
+        METRICS.register("dropped_capture", lambda: self.frames_dropped, kind="counter")
+
+    def frame_consumed(self):
+        self._consumer_free.set()
+
+    def _emit(self, frame, source):
+        if self.frame_callback is not None and self.frame_callback(frame, source):
+            return
+        self._consumer_free.clear()
+        self.frame_captured.emit(frame, source)
+
+    def _retrieve_and_emit(self, cap, frame_idx, ts):
+        with METRICS.timer("decode"):
+            ret, frame = cap.retrieve()
+        if ret:
+            METRICS.tick("capture")
+            self._emit(frame, source_info(frame_idx, ts))
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            print(f"Не удалось открыть источник: {self.source}")
+            return
+        if self.live:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self._run_live(cap)
+        else:
+            self._run_file(cap)
+        cap.release()
+
+    def _run_file(self, cap):
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if 0 < fps < 1000 else 30.0
+        interval = 1.0 / self.fps
+        t_base = time.monotonic()
+        ts_base = None
+        for frame_idx, ts in self.sampler.positions(cap, self.fps):
+            if not self._running:
+                break
+            # Темп — по времени кадра в источнике, с учётом пропущенных сэмплером
+            if ts_base is None:
+                ts_base = ts
+            delay = t_base + (ts - ts_base) / 1000.0 - time.monotonic()
+            if delay > 0:
+                # При редком прореживании ждать приходится долго — stop() не должен ждать столько же
+                while delay > 0 and self._running:
+                    time.sleep(min(delay, 0.1))
+                    delay = t_base + (ts - ts_base) / 1000.0 - time.monotonic()
+            elif delay < -interval:
+                # Не копим отставание после долгой паузы декодера
+                t_base, ts_base = time.monotonic(), ts
+            if self._consumer_free.is_set():
+                self._retrieve_and_emit(cap, frame_idx, ts)
+            else:
+                # Потребитель не успевает — кадр уже захвачен grab(), в BGR не переводим
+                self.frames_dropped += 1
+
+    def _run_live(self, cap):
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        for frame_idx, ts in self.sampler.positions(cap, self.fps, seekable=False):
+            if not self._running:
+                break
+            if self._consumer_free.is_set():
+                self._retrieve_and_emit(cap, frame_idx, ts)
+            else:
+                self.frames_dropped += 1
+        else:
+            if self._running:
+                print(f"Поток прерван: {self.source}")
+
+    def stop(self):
+        self._running = False
+        self.wait()
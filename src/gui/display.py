@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+
+def fit_size(frame_w, frame_h, target_w, target_h):
+    """Размер кадра, вписанного в target с сохранением пропорций."""
+    scale = min(target_w / frame_w, target_h / frame_h)
+    return max(1, int(frame_w * scale)), max(1, int(frame_h * scale))
+
+
+class DisplayConverter:
+    """Подготовка кадра к показу: уменьшение до размера виджета (INTER_AREA)
+    и BGR → RGB в заранее выделенные буферы.
+
+    Используется из рабочих потоков, чтобы GUI-поток только копировал готовую
+    картинку на экран. Выходные буферы идут по кругу (num_buffers штук):
+    результат остаётся валидным, пока не сделано ещё num_buffers конвертаций.
+    """
+
+    def __init__(self, num_buffers=3):
+        self.num_buffers = num_buffers
+        self._scaled = None
+        self._rgb = [None] * num_buffers
+        self._next = 0
+
+    def _buffer(self, buf, shape, dtype):
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            return np.empty(shape, dtype=dtype)
+        return buf
+
+    def convert(self, frame, target_size):
+        h, w = frame.shape[:2]
+        out_w, out_h = fit_size(w, h, target_size[0], target_size[1])
+        if (out_w, out_h) != (w, h):
+            self._scaled = self._buffer(self._scaled, (out_h, out_w) + frame.shape[2:], frame.dtype)
+            interpolation = cv2.INTER_AREA if out_w < w else cv2.INTER_LINEAR
+            cv2.resize(frame, (out_w, out_h), dst=self._scaled, interpolation=interpolation)
+            frame = self._scaled
+
+        idx = self._next
+        self._next = (self._next + 1) % self.num_buffers
+        self._rgb[idx] = self._buffer(self._rgb[idx], (out_h, out_w, 3), frame.dtype)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb[idx])
+        return self._rgb[idx]
@@ -1,10 +1,11 @@
 from PyQt5 import QtCore
-import queue
-import time
 import numpy as np
 
+from inference.budget import LatencyBudgetController
 from inference.engine import InferenceEngine
+from inference.pipeline import StagedPipeline
 from utils.config import Config
+from utils.metrics import METRICS, MetricsDumper
 
 class InferenceThread(QtCore.QThread):
     result_ready = QtCore.pyqtSignal(np.ndarray)
@@ -12,42 +13,69 @@ class InferenceThread(QtCore.QThread):
 
     def __init__(self, config=None, parent=None):
         super().__init__(parent)
-        self.frame_queue = queue.Queue(maxsize=2)
         self._running = True
         self.config = config or Config()
         self.engine = InferenceEngine(self.config)
         self.daemon = True
-        self.frame_idx = 0
+        # Потокобезопасный приёмник кадров для показа (VideoPlayerWidget.present)
+        self.display_sink = None
+        # Потокобезопасный приёмник размеченных кадров для записи (VideoRecorder.add)
+        self.record_sink = None
+        # Подстройка imgsz / прореживания / батча под target_fps или latency_budget_ms
+        self.controller = LatencyBudgetController.from_config(self.config)
+        self.pipeline = StagedPipeline(
+            self.engine,
+            self._on_pipeline_result,
+            queue_sizes=self.config.get("pipeline_queue_sizes"),
+            drop_policies=self.config.get("pipeline_drop_policies"),
+            controller=self.controller,
+        )
 
-    def put_frame(self, frame):
-        try:
-            self.frame_queue.put_nowait(frame)
-        except queue.Full:
-            pass
+    def put_frame(self, frame, source=None):
+        # Переполнение входной очереди учитывается в её счётчике dropped
+        # (метрика dropped_queue_capture); source — номер и время кадра в видео
+        METRICS.tick("input")
+        self.pipeline.put(frame, source)
 
     def update_config(self, config):
         self.config = config
-        self.engine.reload_config(self.config)
+        # Пороги применяются сразу, новые модели грузятся в фоне и
+        # подменяются между кадрами — GUI не блокируется
+        self.engine.reload_config(self.config, background=True)
+
+    def _on_pipeline_result(self, frame_idx, frame, results, vis, settings, source):
+        # Вызывается из потока отрисовки конвейера; сигналы Qt доставятся в GUI-поток
+        if self.display_sink is not None:
+            self.display_sink(vis)
+        if self.record_sink is not None:
+            self.record_sink(frame_idx, vis, results)
+        METRICS.tick("output")
+        self.result_ready.emit(vis)
+        frame_result = {
+            "frame_idx": frame_idx,
+            "objects": results
+        }
+        if source:
+            frame_result.update(source)
+        if settings is not None:
+            frame_result["settings"] = settings
+        self.result_full_ready.emit(vis, frame_result)
 
     def run(self):
-        self.frame_idx = 0
+        METRICS.reset()
+        dumper = None
+        dump_path = self.config.get("metrics_dump_path")
+        if METRICS.enabled and dump_path:
+            dumper = MetricsDumper(METRICS, dump_path, self.config.get("metrics_dump_interval", 5.0))
+            dumper.start()
+        self.pipeline.start()
         while self._running:
-            try:
-                frame = self.frame_queue.get(timeout=0.2)
-            except queue.Empty:
-                continue
-            results = self.engine.infer(frame)
-            vis = self.engine.draw_results(frame, results, draw_heatmap=True)
-            self.result_ready.emit(vis)
-            frame_result = {
-                "frame_idx": self.frame_idx,
-                "objects": results
-            }
-            self.result_full_ready.emit(vis, frame_result)
-            self.frame_idx += 1
-            time.sleep(0.01)
+            self.msleep(100)
+        self.pipeline.stop()
+        if dumper is not None:
+            dumper.stop()
         self.quit()
 
     def stop(self):
         self._running = False
-        self.wait()
\ No newline at end of file
+        self.wait()
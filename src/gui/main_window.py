@@ -1,9 +1,16 @@
 import os
-from utils.report_generator import ReportGenerator
-from PyQt5 import QtWidgets
+import time
+from utils.report_generator import ReportGenerator, is_defect_object, summary_metrics
+from PyQt5 import QtCore, QtWidgets
 from gui.video_player import VideoPlayerWidget
 from gui.inference_thread import InferenceThread
 from utils.config import Config
+from utils.frame_sampler import FrameSampler
+from utils.frame_store import FrameStore
+from utils.result_store import ResultStore
+from utils.video_recorder import VideoRecorder
+from inference.backends import BACKENDS, PRECISIONS
+from utils.metrics import METRICS
 
 class ConfigDialog(QtWidgets.QDialog):
     def __init__(self, config, parent=None):
@@ -17,6 +24,12 @@ class ConfigDialog(QtWidgets.QDialog):
         self.device = QtWidgets.QComboBox()
         self.device.addItems(["cuda", "cpu"])
         self.device.setCurrentText(self.config.get("device"))
+        self.backend = QtWidgets.QComboBox()
+        self.backend.addItems(list(BACKENDS))
+        self.backend.setCurrentText(self.config.get("backend", "torch"))
+        self.precision = QtWidgets.QComboBox()
+        self.precision.addItems(list(PRECISIONS))
+        self.precision.setCurrentText(self.config.get("precision", "fp32"))
         self.defect_thr = QtWidgets.QDoubleSpinBox()
         self.defect_thr.setRange(0, 1)
         self.defect_thr.setSingleStep(0.01)
@@ -30,6 +43,8 @@ class ConfigDialog(QtWidgets.QDialog):
         layout.addRow("Путь к детектору", self.det_ckpt)
         layout.addRow("Путь к классификатору", self.cls_ckpt)
         layout.addRow("Устройство (cuda/cpu)", self.device)
+        layout.addRow("Бэкенд инференса", self.backend)
+        layout.addRow("Точность (int8 — после quantize validate)", self.precision)
         layout.addRow("Порог дефекта (0-1)", self.defect_thr)
         layout.addRow("Порог good-класса (0-1)", self.good_thr)
 
@@ -43,6 +58,8 @@ class ConfigDialog(QtWidgets.QDialog):
             "detector_ckpt": self.det_ckpt.text(),
             "classifier_ckpt": self.cls_ckpt.text(),
             "device": self.device.currentText(),
+            "backend": self.backend.currentText(),
+            "precision": self.precision.currentText(),
             "defect_threshold": self.defect_thr.value(),
             "good_threshold": self.good_thr.value()
         }
@@ -77,15 +94,20 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_save_report.setEnabled(False)
         btn_layout.addWidget(self.btn_save_report)
         self.btn_save_report.clicked.connect(self.save_report)
-        self.analysis_results = []
-        self.analysis_frames = []
+        self.analysis_results = ResultStore()
+        self.analysis_frames = self._new_frame_store()
 
         self.layout.addLayout(btn_layout)
         self.video_player = VideoPlayerWidget(self)
         self.layout.addWidget(self.video_player)
         self.statusBar().showMessage("Готово")
+        # Сводка метрик в строке состояния во время анализа (metrics_enabled)
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.update_metrics_status)
 
         self.inference_thread = None
+        self.recorder = None
         self.video_path = None
         self.rtsp_url = None
 
@@ -100,7 +122,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if file_path:
             self.video_path = file_path
             self.rtsp_url = None
-            self.video_player.open_video(file_path)
+            self.video_player.open_video(file_path, FrameSampler.from_config(self.config))
             self.statusBar().showMessage(f"Открыт файл: {file_path}")
 
     def open_rtsp(self):
@@ -108,7 +130,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if ok and url:
             self.rtsp_url = url
             self.video_path = None
-            self.video_player.open_video(url)
+            self.video_player.open_video(url, FrameSampler.from_config(self.config))
             self.statusBar().showMessage(f"Открыт RTSP: {url}")
 
     def start_analysis(self):
@@ -119,13 +141,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_stop.setEnabled(True)
         self.statusBar().showMessage("Анализ запущен...")
         self.inference_thread = InferenceThread(self.config)
-        self.inference_thread.result_ready.connect(self.on_result_ready)
+        self.inference_thread.display_sink = self.video_player.present
+        if self.config.get("record_enabled", False):
+            self.recorder = self._new_recorder()
+            self.inference_thread.record_sink = self.recorder.add
         self.inference_thread.result_full_ready.connect(self.on_result_full_ready)
         self.inference_thread.finished.connect(self.on_analysis_finished)
         self.video_player.set_analysis_mode(True)
         self.inference_thread.start()
+        if METRICS.enabled:
+            self.metrics_timer.start()
 
     def stop_analysis(self):
+        self.metrics_timer.stop()
         if self.inference_thread is not None:
             self.inference_thread.stop()
         self.btn_stop.setEnabled(False)
@@ -133,57 +161,94 @@ class MainWindow(QtWidgets.QMainWindow):
         self.statusBar().showMessage("Анализ остановлен")
         self.video_player.set_analysis_mode(False)
 
-    def on_frame_ready(self, frame):
+    def on_frame_ready(self, frame, source):
         if self.inference_thread is not None and self.inference_thread.isRunning():
-            self.inference_thread.put_frame(frame)
+            self.inference_thread.put_frame(frame, source)
         else:
             self.video_player.show_frame(frame)
 
-    def on_result_ready(self, frame_vis):
-        self.video_player.show_frame(frame_vis)
-
     def on_result_full_ready(self, frame_vis, frame_result):
-        self.video_player.show_frame(frame_vis)
-        self.analysis_frames.append(frame_vis.copy())
+        # При записи видео отчёт ссылается на время в записи — кадры не храним.
+        # Иначе (и если запись не открылась) храним только кадры с дефектами
+        # (их скриншоты попадают в отчёт); сверх бюджета памяти — во временную папку
+        if not self._recording():
+            has_defect = any(is_defect_object(obj) for obj in frame_result["objects"])
+            self.analysis_frames.add(frame_result["frame_idx"], frame_vis, has_defect)
         self.analysis_results.append(frame_result)
 
+    def update_metrics_status(self):
+        self.statusBar().showMessage(METRICS.summary())
+
     def on_analysis_finished(self):
+        self.metrics_timer.stop()
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
-        self.statusBar().showMessage("Анализ завершён")
+        message = "Анализ завершён"
+        engine = self.inference_thread.engine if self.inference_thread else None
+        gating = engine.gating_stats() if engine else None
+        if gating and gating["frames_skipped"]:
+            message += f" (без изменений сцены пропущено {gating['frames_skipped']} из {gating['frames_total']} кадров)"
+        if engine is not None and engine.tiling_enabled:
+            message += f", тайловая детекция: {engine.tiling_throughput():.2f} Мп/с"
+        if self.recorder is not None:
+            path = self.recorder.close()
+            if self.recorder.frames_written:
+                message += f", запись: {path}"
+        self.statusBar().showMessage(message)
         self.video_player.set_analysis_mode(False)
         self.btn_save_report.setEnabled(True)
 
     def save_report(self):
-        if not self.analysis_results or not self.analysis_frames:
+        if not self.analysis_results:
             QtWidgets.QMessageBox.warning(self, "Нет данных", "Нет результатов для отчёта.")
             return
-        video_name = os.path.splitext(os.path.basename(self.video_path or "rtsp_stream"))[0]
         gen = ReportGenerator()
-        total_frames = len(self.analysis_results)
         defect_thr = float(self.config.get("defect_threshold", 0.7))
-        defect_frames = sum(
-            any(
-                "good" not in obj["defect_class"] and obj["defect_conf"] >= defect_thr
-                for obj in frame["objects"]
-            )
-            for frame in self.analysis_results
-        )
-        extra_metrics = {
-            "Всего кадров": total_frames,
-            f"Кадров с дефектами (>={int(defect_thr*100)}%)": defect_frames,
-            "Доля кадров с дефектами": f"{defect_frames / (total_frames or 1):.2%}",
-        }
+        extra_metrics = summary_metrics(self.analysis_results, defect_thr)
+        frame_times = None
+        if self._recording():
+            extra_metrics["Видеозапись"] = self.recorder.path
+            frame_times = self.recorder.record_times
         path = gen.save_report(
             self.analysis_results,
-            video_name=video_name,
-            frame_images=self.analysis_frames,
+            video_name=self._video_name(),
+            frame_images=None if self._recording() else self.analysis_frames,
             extra_metrics=extra_metrics,
+            frame_times=frame_times,
         )
+        # Покадровые результаты рядом с отчётом — для повторного анализа без видео
+        self.analysis_results.save(os.path.splitext(path)[0] + "_results.npz")
         QtWidgets.QMessageBox.information(self, "Отчёт", f"Отчёт сохранён:\n{path}")
         self.btn_save_report.setEnabled(False)
         self.analysis_results.clear()
         self.analysis_frames.clear()
+        self.recorder = None
+
+    def _recording(self):
+        return self.recorder is not None and not self.recorder.failed
+
+    def _video_name(self):
+        return os.path.splitext(os.path.basename(self.video_path or "rtsp_stream"))[0]
+
+    def _new_recorder(self):
+        record_dir = self.config.get("record_dir", "recordings")
+        ext = self.config.get("record_format", "mp4")
+        path = os.path.join(record_dir, f"{self._video_name()}_{time.strftime('%Y%m%d_%H%M%S')}.{ext}")
+        capture = self.video_player.capture
+        return VideoRecorder(
+            path,
+            fps=self.config.get("record_fps") or (capture.fps if capture is not None else 0),
+            queue_size=int(self.config.get("record_queue_size", 32)),
+            drop_policy=self.config.get("record_drop_policy", "block"),
+            defect_threshold=float(self.config.get("defect_threshold", 0.7)),
+        )
+
+    def _new_frame_store(self):
+        return FrameStore(
+            memory_budget_mb=float(self.config.get("frame_store_budget_mb", 256)),
+            spill_format=self.config.get("frame_store_format", "jpeg"),
+            context_every=int(self.config.get("frame_store_context_every", 0)),
+        )
 
     def open_config_dialog(self):
         dlg = ConfigDialog(self.config, self)
@@ -1,62 +1,107 @@
-import cv2
 import threading
 from PyQt5 import QtCore, QtGui, QtWidgets
 import numpy as np
 
+from gui.capture_thread import CaptureThread
+from gui.display import DisplayConverter
+
 class VideoPlayerWidget(QtWidgets.QLabel):
-    frame_ready = QtCore.pyqtSignal(np.ndarray)
+    frame_ready = QtCore.pyqtSignal(np.ndarray, dict)
+    _display_requested = QtCore.pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAlignment(QtCore.Qt.AlignCenter)
-        self.cap = None
-        self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(self.next_frame)
+        self.capture = None
         self.analysis_mode = False
         self.frame_lock = threading.Lock()
         self.current_frame = None
+        # Подготовка кадров к показу идёт в потоке-источнике (захват, отрисовка
+        # результатов), у каждого потока свой конвертер с собственными буферами
+        self._converters = threading.local()
+        self._display_size = (960, 540)
+        self._display_lock = threading.Lock()
+        self._pending_display = None
+        self._display_scheduled = False
+        self._display_requested.connect(self._blit)
+
+    def open_video(self, path_or_url, sampler=None):
+        self.close_video()
+        # Декодирование — в отдельном потоке, GUI только получает готовые кадры
+        self.capture = CaptureThread(path_or_url, self, sampler=sampler)
+        self.capture.frame_callback = self._on_captured
+        self.capture.frame_captured.connect(self.next_frame)
+        self.capture.start()
 
-    def open_video(self, path_or_url):
-        if self.cap is not None:
-            self.cap.release()
-        self.cap = cv2.VideoCapture(path_or_url)
-        self.timer.start(30)  # ~30 FPS
+    def close_video(self):
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
 
     def is_opened(self):
-        return self.cap is not None and self.cap.isOpened()
+        return self.capture is not None and self.capture.isRunning()
 
     def set_analysis_mode(self, enabled):
         self.analysis_mode = enabled
 
-    def next_frame(self):
-        if self.cap is None or not self.cap.isOpened():
-            self.timer.stop()
-            return
-        ret, frame = self.cap.read()
-        if not ret:
-            self.timer.stop()
-            return
+    def _on_captured(self, frame, source):
+        # Поток захвата: в режиме просмотра кадр готовится к показу прямо здесь
+        with self.frame_lock:
+            self.current_frame = frame
+        if self.analysis_mode:
+            return False
+        self.present(frame)
+        return True
+
+    def next_frame(self, frame, source):
         with self.frame_lock:
-            self.current_frame = frame.copy()
+            self.current_frame = frame
         # Если анализ — сигнал наверх, иначе отображаем
         if self.analysis_mode:
-            self.frame_ready.emit(frame)
+            self.frame_ready.emit(frame, source)
         else:
             self.show_frame(frame)
+        if self.capture is not None:
+            self.capture.frame_consumed()
 
-    def show_frame(self, frame):
-        # Преобразовать BGR (cv2) -> RGB (Qt)
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def present(self, frame):
+        """Потокобезопасный показ BGR-кадра. Уменьшение и BGR→RGB выполняются в
+        вызывающем потоке; пока предыдущий кадр не выведен на экран, новые
+        пропускаются — экран всё равно не успел бы их показать."""
+        with self._display_lock:
+            if self._display_scheduled:
+                return False
+        converter = getattr(self._converters, "converter", None)
+        if converter is None:
+            converter = self._converters.converter = DisplayConverter()
+        rgb = converter.convert(frame, self._display_size)
+        with self._display_lock:
+            self._pending_display = rgb
+            self._display_scheduled = True
+        self._display_requested.emit()
+        return True
+
+    def _blit(self):
+        with self._display_lock:
+            rgb, self._pending_display = self._pending_display, None
+            self._display_scheduled = False
+        if rgb is None:
+            return
         h, w, ch = rgb.shape
-        bytes_per_line = ch * w
-        qimg = QtGui.QImage(rgb.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        pixmap = QtGui.QPixmap.fromImage(qimg)
-        self.setPixmap(pixmap.scaled(self.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+        qimg = QtGui.QImage(rgb.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
+        # fromImage копирует данные — буфер конвертера сразу свободен
+        self.setPixmap(QtGui.QPixmap.fromImage(qimg))
+
+    def show_frame(self, frame):
+        self.present(frame)
+
+    def resizeEvent(self, event):
+        self._display_size = (max(1, self.width()), max(1, self.height()))
+        super().resizeEvent(event)
 
     def sizeHint(self):
         return QtCore.QSize(960, 540)
 
     def closeEvent(self, event):
-        if self.cap is not None:
-            self.cap.release()
+        self.close_video()
         super().closeEvent(event)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import json
+import os
+
+from ultralytics import YOLO
+
+BACKENDS = ("torch", "onnxruntime", "openvino")
+PRECISIONS = ("fp32", "int8")
+# Бэкенды, для которых inference/quantize.py умеет готовить INT8-модели
+INT8_BACKENDS = ("onnxruntime", "openvino")
+
+# Формат экспорта Ultralytics для каждого бэкенда
+EXPORT_FORMATS = {
+    "onnxruntime": "onnx",
+    "openvino": "openvino",
+}
+
+
+def exported_path(ckpt, backend):
+    """Путь к экспортированной модели рядом с .pt (так её сохраняет Ultralytics)."""
+    base = os.path.splitext(ckpt)[0]
+    if backend == "onnxruntime":
+        return base + ".onnx"
+    if backend == "openvino":
+        return base + "_openvino_model"
+    return ckpt
+
+
+def int8_path(ckpt, backend):
+    """Путь к INT8-модели рядом с .pt (для OpenVINO — как называет её Ultralytics)."""
+    base = os.path.splitext(ckpt)[0]
+    if backend == "onnxruntime":
+        return base + "_int8.onnx"
+    if backend == "openvino":
+        return base + "_int8_openvino_model"
+    raise ValueError(f"INT8 поддерживается только для бэкендов: {', '.join(INT8_BACKENDS)}")
+
+
+def agreement_path(artifact):
+    """Файл с результатом проверки INT8-модели против fp32 (quantize.py validate)."""
+    return artifact.rstrip("/\\") + ".agreement.json"
+
+
+def _is_fresh(artifact, ckpt):
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(ckpt)
+
+
+def resolve_weights(ckpt, backend):
+    """Возвращает путь к весам для выбранного бэкенда.
+    При первом использовании экспортирует .pt и кэширует результат рядом с ним."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {backend}. Доступны: {', '.join(BACKENDS)}")
+    if backend == "torch":
+        return ckpt
+    artifact = exported_path(ckpt, backend)
+    if _is_fresh(artifact, ckpt):
+        return artifact
+    print(f"Экспорт {ckpt} в формат {backend}...")
+    # dynamic=True — чтобы классификатор принимал батчи ROI переменного размера
+    return YOLO(ckpt).export(format=EXPORT_FORMATS[backend], dynamic=True)
+
+
+def resolve_device(device, backend):
+    # OpenVINO в нашей сборке работает только на CPU; без GPU откатываемся на CPU
+    if backend == "openvino":
+        return "cpu"
+    if str(device).startswith("cuda"):
+        try:
+            import torch
+            available = torch.cuda.is_available()
+        except ImportError:
+            available = False
+        if not available:
+            print("CUDA недоступна, инференс будет выполняться на CPU")
+            return "cpu"
+    return device
+
+
+def check_int8(ckpt, backend, min_agreement):
+    """Возвращает (путь к INT8-модели, None), если её можно включить,
+    иначе (None, причина). INT8 включается только после проверки
+    согласия с fp32 на отложенной выборке не ниже min_agreement."""
+    if backend not in INT8_BACKENDS:
+        return None, f"бэкенд {backend} не поддерживает INT8"
+    artifact = int8_path(ckpt, backend)
+    if not _is_fresh(artifact, ckpt):
+        return None, "нет актуальной INT8-модели (python -m inference.quantize export)"
+    report = agreement_path(artifact)
+    if not _is_fresh(report, artifact):
+        return None, "INT8-модель не проверена (python -m inference.quantize validate)"
+    with open(report, "r", encoding="utf-8") as f:
+        agreement = float(json.load(f)["agreement"])
+    if agreement < min_agreement:
+        return None, f"согласие с fp32 {agreement:.3f} ниже порога {min_agreement:.3f}"
+    return artifact, None
+
+
+def load_model(ckpt, task, backend="torch", precision="fp32", min_agreement=0.98):
+    if precision == "int8":
+        artifact, reason = check_int8(ckpt, backend, min_agreement)
+        if artifact is not None:
+            print(f"INT8-модель: {artifact}")
+            return YOLO(artifact, task=task)
+        print(f"INT8 для {ckpt} не включён: {reason}. Используется fp32")
+    return YOLO(resolve_weights(ckpt, backend), task=task)
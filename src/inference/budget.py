@@ -0,0 +1,109 @@
+import collections
+import threading
+
+DEFAULT_IMGSZ_LEVELS = (640, 512, 416, 320)
+
+
+class LatencyBudgetController:
+    """Подстройка обработки под бюджет задержки на кадр.
+
+    По скользящему среднему задержки кадра (от постановки в очередь до
+    готового результата) раз в window кадров делается один шаг:
+    при превышении бюджета сначала уменьшается imgsz детектора, затем
+    растёт шаг прореживания кадров (stride); при запасе ниже
+    low_watermark * бюджет — шаги в обратном порядке. Размер батча
+    классификатора подбирается так, чтобы все ROI кадра уходили в один
+    вызов (не больше max_batch).
+    """
+
+    def __init__(self, budget_ms, imgsz_levels=DEFAULT_IMGSZ_LEVELS, max_stride=4, max_batch=32,
+                 window=10, low_watermark=0.6, ema_alpha=0.2):
+        self.budget_ms = float(budget_ms)
+        self.imgsz_levels = tuple(int(s) for s in imgsz_levels) or DEFAULT_IMGSZ_LEVELS
+        self.max_stride = max(1, int(max_stride))
+        self.max_batch = max(1, int(max_batch))
+        self.window = max(1, int(window))
+        self.low_watermark = low_watermark
+        self.ema_alpha = ema_alpha
+        self.level = 0
+        self.stride = 1
+        self.classifier_batch_size = self.max_batch
+        self.frames_skipped = 0
+        self.latency_ms = None
+        self._since_change = 0
+        self._rois = collections.deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """None, если ни target_fps, ни latency_budget_ms не заданы."""
+        budget_ms = float(config.get("latency_budget_ms") or 0)
+        target_fps = float(config.get("target_fps") or 0)
+        if budget_ms <= 0 and target_fps > 0:
+            budget_ms = 1000.0 / target_fps
+        if budget_ms <= 0:
+            return None
+        return cls(
+            budget_ms,
+            imgsz_levels=config.get("budget_imgsz_levels") or DEFAULT_IMGSZ_LEVELS,
+            max_stride=config.get("budget_max_stride", 4),
+            max_batch=config.get("classifier_batch_size", 32),
+        )
+
+    @property
+    def imgsz(self):
+        return self.imgsz_levels[self.level]
+
+    def admit(self, frame_idx):
+        """Обрабатывать ли кадр при текущем шаге прореживания."""
+        if frame_idx % self.stride == 0:
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def settings(self):
+        with self._lock:
+            return {
+                "imgsz": self.imgsz,
+                "stride": self.stride,
+                "classifier_batch_size": self.classifier_batch_size,
+            }
+
+    def update(self, latency_ms, num_rois=0):
+        with self._lock:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += self.ema_alpha * (latency_ms - self.latency_ms)
+            self._rois.append(num_rois)
+            self._since_change += 1
+            if self._since_change < self.window:
+                return
+            if self.latency_ms > self.budget_ms:
+                self._degrade()
+            elif self.latency_ms < self.budget_ms * self.low_watermark:
+                self._upgrade()
+            self.classifier_batch_size = min(self.max_batch, max(1, max(self._rois)))
+
+    def _degrade(self):
+        if self.level < len(self.imgsz_levels) - 1:
+            self.level += 1
+        elif self.stride < self.max_stride:
+            self.stride += 1
+        else:
+            return
+        self._changed()
+
+    def _upgrade(self):
+        if self.stride > 1:
+            self.stride -= 1
+        elif self.level > 0:
+            self.level -= 1
+        else:
+            return
+        self._changed()
+
+    def _changed(self):
+        # Новое среднее набирается заново — старые замеры относятся к другим настройкам
+        self._since_change = 0
+        self.latency_ms = None
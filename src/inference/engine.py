@@ -1,6 +1,25 @@
+import threading
+import time
+
 import numpy as np
 import cv2
-from ultralytics import YOLO
+
+from inference.backends import resolve_device
+from inference.gating import SceneChangeGate
+from inference.model_cache import get_model, model_version
+from inference.rendering import OverlayRenderer
+from inference.tiling import make_tiles, merge_detections
+from inference.tracker import IoUTracker
+from utils.metrics import METRICS
+
+# Детекторные классы, для которых обучен классификатор дефектов (см. classifier_classes)
+DEFAULT_CLASSIFIER_ROUTING = {
+    "yoke suspension": "default",
+    "vari-grip": "default",
+    "polymer insulator upper shackle": "default",
+    "glass insulator": "default",
+    "lightning rod suspension": "default",
+}
 
 class InferenceEngine:
     def __init__(self, config=None):
@@ -8,20 +27,66 @@ class InferenceEngine:
             from utils.config import Config
             config = Config()
         self.config = config if hasattr(config, "get") else None
+        self._swap_lock = threading.Lock()
+        self._pending_models = None
+        # Номер последнего запроса моделей: фоновая загрузка, начатая для
+        # более раннего запроса, свой результат не устанавливает
+        self._load_generation = 0
+        self._loader_thread = None
+        self.trackers = {}
+        self.tiling_stats = {"megapixels": 0.0, "seconds": 0.0, "tiles": 0}
+        self.gates = {}
+        self._last_results = {}
         self.update_params()
 
     def update_params(self):
+        self._apply_params()
+        self._install_models(self._load_models(self._model_spec()))
+
+    def _apply_params(self):
+        # Параметры, которые меняются без перезагрузки моделей
         cfg = self.config.config if self.config else {}
-        self.detector_ckpt = cfg.get("detector_ckpt", "checkpoints/detector/weights/best.pt")
-        self.classifier_ckpt = cfg.get("classifier_ckpt", "checkpoints/classifier/weights/best.pt")
-        self.device = cfg.get("device", "cuda")
         self.defect_threshold = float(cfg.get("defect_threshold", 0.7))
         self.good_threshold = float(cfg.get("good_threshold", 0.5))
-
-        print(f"Загрузка детектора: {self.detector_ckpt}")
-        self.detector = YOLO(self.detector_ckpt)
-        print(f"Загрузка классификатора: {self.classifier_ckpt}")
-        self.classifier = YOLO(self.classifier_ckpt)
+        self.classifier_batch_size = max(1, int(cfg.get("classifier_batch_size", 32)))
+        # Какой классификатор применять к классу детектора; не указанные классы
+        # и значение "none" — без классификации (объект не попадает в результаты)
+        self.classifier_routing = dict(cfg.get("classifier_routing") or DEFAULT_CLASSIFIER_ROUTING)
+        self.tiling_enabled = bool(cfg.get("tiling_enabled", False))
+        self.tile_size = int(cfg.get("tile_size", 640))
+        self.tile_overlap = float(cfg.get("tile_overlap", 0.2))
+        self.tile_batch_size = max(1, int(cfg.get("tile_batch_size", 8)))
+        self.tile_nms_iou = float(cfg.get("tile_nms_iou", 0.5))
+        if not hasattr(self, "renderer"):
+            self.renderer = OverlayRenderer()
+        self.renderer.draw_text = bool(cfg.get("render_text", True))
+        METRICS.enabled = bool(cfg.get("metrics_enabled", False))
+        self.tracking_enabled = bool(cfg.get("tracking_enabled", False))
+        track_iou_threshold = float(cfg.get("track_iou_threshold", 0.3))
+        if track_iou_threshold <= 0:
+            raise ValueError(f"track_iou_threshold должен быть больше 0: {track_iou_threshold}")
+        self.tracker_params = {
+            "iou_threshold": track_iou_threshold,
+            "max_age": int(cfg.get("track_max_age", 10)),
+            "refresh_interval": int(cfg.get("track_refresh_interval", 15)),
+            "reclassify_iou": float(cfg.get("track_reclassify_iou", 0.6)),
+        }
+        # Снимки словарей: потоки конвейера добавляют трекеры и гейты во время применения настроек
+        for tracker in list(self.trackers.values()):
+            for k, v in self.tracker_params.items():
+                setattr(tracker, k, v)
+        self.gating_enabled = bool(cfg.get("gating_enabled", False))
+        self.gating_params = {
+            "threshold": float(cfg.get("gating_threshold", 3.0)),
+            "force_every": int(cfg.get("gating_force_every", 30)),
+            "method": cfg.get("gating_method", "diff"),
+        }
+        if any(gate.method != self.gating_params["method"] for gate in list(self.gates.values())):
+            # Новый словарь вместо clear(): gate_frame в потоке конвейера работает со своей ссылкой
+            self.gates = {}
+        for gate in list(self.gates.values()):
+            gate.threshold = self.gating_params["threshold"]
+            gate.force_every = self.gating_params["force_every"]
 
         self.detector_classes = [
             "yoke", "yoke suspension", "spacer", "stockbridge damper", "lightning rod shackle",
@@ -37,72 +102,322 @@ class InferenceEngine:
             "glass-insulator_good"
         ]
 
-    def reload_config(self, config):
+    def _model_spec(self):
+        # Параметры, изменение которых требует загрузки других моделей
+        cfg = self.config.config if self.config else {}
+        backend = cfg.get("backend", "torch")
+        classifier_ckpts = {"default": cfg.get("classifier_ckpt", "checkpoints/classifier/weights/best.pt")}
+        classifier_ckpts.update(cfg.get("extra_classifier_ckpts") or {})
+        detector_ckpt = cfg.get("detector_ckpt", "checkpoints/detector/weights/best.pt")
+        precision = cfg.get("precision", "fp32")
+        return {
+            "detector_ckpt": detector_ckpt,
+            "classifier_ckpt": classifier_ckpts["default"],
+            "classifier_ckpts": classifier_ckpts,
+            "backend": backend,
+            "device": resolve_device(cfg.get("device", "cuda"), backend),
+            "precision": precision,
+            "int8_min_agreement": float(cfg.get("int8_min_agreement", 0.98)),
+            # Версии файлов моделей: после quantize export/validate повторное применение
+            # настроек подключает новую INT8-модель без перезапуска
+            "model_versions": [
+                model_version(ckpt, backend, precision)
+                for ckpt in [detector_ckpt, *classifier_ckpts.values()]
+            ],
+        }
+
+    def _load_models(self, spec):
+        print(f"Загрузка детектора: {spec['detector_ckpt']} ({spec['backend']})")
+        detector = get_model(
+            spec["detector_ckpt"], "detect", spec["backend"], spec["device"],
+            spec["precision"], spec["int8_min_agreement"],
+        )
+        classifiers = {}
+        for name, ckpt in spec["classifier_ckpts"].items():
+            print(f"Загрузка классификатора {name}: {ckpt} ({spec['backend']})")
+            classifiers[name] = get_model(
+                ckpt, "classify", spec["backend"], spec["device"],
+                spec["precision"], spec["int8_min_agreement"],
+            )
+        return spec, detector, classifiers
+
+    def _install_models(self, loaded):
+        spec, (self.detector, self._detector_lock), self.classifiers = loaded
+        self.classifier, self._classifier_lock = self.classifiers["default"]
+        self.model_spec = spec
+        self.detector_ckpt = spec["detector_ckpt"]
+        self.classifier_ckpt = spec["classifier_ckpt"]
+        self.backend = spec["backend"]
+        self.device = spec["device"]
+
+    def reload_config(self, config, background=False):
+        """Пороги применяются сразу. Если изменились чекпоинты/бэкенд/устройство,
+        модели загружаются заново; при background=True — в фоновом потоке,
+        а подмена происходит между кадрами (см. swap_pending_models)."""
         self.config = config
-        self.update_params()
+        self._apply_params()
+        spec = self._model_spec()
+        with self._swap_lock:
+            self._load_generation += 1
+            generation = self._load_generation
+            if spec == self.model_spec:
+                # Вернулись к активным моделям — загруженные ранее в фоне уже не нужны
+                self._pending_models = None
+                return
+        if not background:
+            self._install_models(self._load_models(spec))
+            return
+
+        def load():
+            try:
+                loaded = self._load_models(spec)
+            except Exception as e:
+                print(f"Ошибка загрузки моделей: {e}")
+                return
+            with self._swap_lock:
+                if generation == self._load_generation:
+                    self._pending_models = loaded
+
+        self._loader_thread = threading.Thread(target=load, daemon=True)
+        self._loader_thread.start()
+
+    def swap_pending_models(self):
+        """Атомарно подставляет загруженные в фоне модели. Вызывается между кадрами."""
+        if self._pending_models is None:
+            return False
+        with self._swap_lock:
+            loaded, self._pending_models = self._pending_models, None
+        if loaded is None:
+            return False
+        self._install_models(loaded)
+        print("Новые модели подключены")
+        return True
+
+    def tracker(self, stream_id=None):
+        # Отдельный трекер на каждый поток: ID треков разных камер не пересекаются по смыслу
+        if stream_id not in self.trackers:
+            self.trackers[stream_id] = IoUTracker(**self.tracker_params)
+        return self.trackers[stream_id]
+
+    def reset_tracking(self, *stream_ids):
+        """Сбрасывает треки и состояние гейтинга указанных потоков (без аргументов — всех)."""
+        if not stream_ids:
+            self.trackers.clear()
+            self.gates = {}
+            self._last_results.clear()
+        for stream_id in stream_ids:
+            self.trackers.pop(stream_id, None)
+            self.gates.pop(stream_id, None)
+            self._last_results.pop(stream_id, None)
 
-    def infer(self, image):
-        results = []
-        det_out = self.detector.predict(image, device=self.device, verbose=False)[0]
-        boxes = det_out.boxes.xyxy.cpu().numpy()
-        scores = det_out.boxes.conf.cpu().numpy()
-        classes = det_out.boxes.cls.cpu().numpy().astype(int)
+    def gate_frame(self, image, stream_id=None):
+        """Если сцена не изменилась с последнего полного прохода, возвращает
+        копию его результатов; иначе None — кадр нужно анализировать полностью."""
+        if not self.gating_enabled:
+            return None
+        gates = self.gates
+        gate = gates.get(stream_id)
+        if gate is None:
+            gate = gates[stream_id] = SceneChangeGate(**self.gating_params)
+        last = self._last_results.get(stream_id)
+        if last is None:
+            # Переиспользовать нечего: кадр пойдёт на полный проход и станет опорным для гейта
+            gate.reset()
+        if gate.check(image):
+            return None
+        return [dict(res) for res in last]
 
+    def remember_results(self, stream_id, results):
+        if self.gating_enabled:
+            self._last_results[stream_id] = results
+
+    def gating_stats(self):
+        stats = {"frames_total": 0, "frames_skipped": 0}
+        for gate in list(self.gates.values()):
+            for k, v in gate.stats().items():
+                stats[k] += v
+        return stats
+
+    def infer(self, image, stream_id=None):
+        return self.infer_batch([image], [stream_id])[0]
+
+    def infer_batch(self, images, stream_ids=None):
+        """Анализ списка кадров: один вызов детектора на все кадры
+        и общий батч классификатора на все их ROI.
+        stream_ids — источник каждого кадра (нужен трекеру при нескольких потоках)."""
+        self.swap_pending_models()
+        if stream_ids is None:
+            stream_ids = [None] * len(images)
+        results = [self.gate_frame(image, sid) for image, sid in zip(images, stream_ids)]
+        todo = [pos for pos, res in enumerate(results) if res is None]
+        if todo:
+            todo_images = [images[pos] for pos in todo]
+            todo_ids = [stream_ids[pos] for pos in todo]
+            detections = self.detect(todo_images)
+            for pos, res in zip(todo, self.classify(todo_images, detections, todo_ids)):
+                results[pos] = res
+                self.remember_results(stream_ids[pos], res)
+        return results
+
+    def detect(self, images, imgsz=None):
+        """Для каждого кадра возвращает список детекций (bbox, obj_class_name, obj_conf).
+        imgsz — размер входа детектора (None — как при обучении); в тайловом режиме не используется."""
+        if self.tiling_enabled:
+            with METRICS.timer("detect"):
+                return [self._detect_tiled(image) for image in images]
+        # Ссылки на модель и её блокировку берём один раз: swap_pending_models
+        # может подменить их из другого потока конвейера
+        detector, detector_lock = self.detector, self._detector_lock
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        with METRICS.timer("detect"), detector_lock:
+            det_outs = detector.predict(images, device=self.device, verbose=False, **kwargs)
+        detections = []
+        for det_out in det_outs:
+            boxes = det_out.boxes.xyxy.cpu().numpy()
+            scores = det_out.boxes.conf.cpu().numpy()
+            classes = det_out.boxes.cls.cpu().numpy().astype(int)
+            detections.append(self._to_detections(boxes, scores, classes))
+        return detections
+
+    def _to_detections(self, boxes, scores, classes):
+        frame_dets = []
         for i in range(len(boxes)):
             x1, y1, x2, y2 = map(int, boxes[i])
-            obj_class_id = classes[i]
-            obj_conf = float(scores[i])
-            obj_class_name = self.detector_classes[obj_class_id]
-
-            roi = image[y1:y2, x1:x2]
-            if roi.size == 0 or roi.shape[0] < 10 or roi.shape[1] < 10:
-                continue
-
-            cls_out = self.classifier.predict(roi, device=self.device, verbose=False)[0]
-            cls_probs = cls_out.probs.data.cpu().numpy()
-            cls_id = int(np.argmax(cls_probs))
-            defect_class = self.classifier.model.names[cls_id] if hasattr(self.classifier.model, 'names') else self.classifier_classes[cls_id]
-            defect_conf = float(cls_probs[cls_id])
-            print
+            frame_dets.append(([x1, y1, x2, y2], self.detector_classes[classes[i]], float(scores[i])))
+        return frame_dets
+
+    def _detect_tiled(self, image):
+        """Детекция на полном разрешении: кадр режется на перекрывающиеся тайлы,
+        тайлы идут в детектор батчами, боксы переводятся в координаты кадра
+        и объединяются NMS. ROI для классификатора потом режутся из исходного кадра."""
+        t0 = time.perf_counter()
+        tiles = make_tiles(image, self.tile_size, self.tile_overlap)
+        detector, detector_lock = self.detector, self._detector_lock
+        all_boxes, all_scores, all_classes = [], [], []
+        for start in range(0, len(tiles), self.tile_batch_size):
+            batch = tiles[start:start + self.tile_batch_size]
+            with detector_lock:
+                det_outs = detector.predict(
+                    [tile for _, _, tile in batch], imgsz=self.tile_size, device=self.device, verbose=False
+                )
+            for (x0, y0, _), det_out in zip(batch, det_outs):
+                boxes = det_out.boxes.xyxy.cpu().numpy()
+                if not len(boxes):
+                    continue
+                all_boxes.append(boxes + np.array([x0, y0, x0, y0], dtype=boxes.dtype))
+                all_scores.append(det_out.boxes.conf.cpu().numpy())
+                all_classes.append(det_out.boxes.cls.cpu().numpy().astype(int))
+
+        frame_dets = []
+        if all_boxes:
+            boxes = np.concatenate(all_boxes)
+            scores = np.concatenate(all_scores)
+            classes = np.concatenate(all_classes)
+            keep = merge_detections(boxes, scores, classes, self.tile_nms_iou)
+            frame_dets = self._to_detections(boxes[keep], scores[keep], classes[keep])
+
+        self.tiling_stats["seconds"] += time.perf_counter() - t0
+        self.tiling_stats["megapixels"] += image.shape[0] * image.shape[1] / 1e6
+        self.tiling_stats["tiles"] += len(tiles)
+        return frame_dets
+
+    def tiling_throughput(self):
+        """Производительность тайловой детекции, мегапикселей в секунду."""
+        seconds = self.tiling_stats["seconds"]
+        return self.tiling_stats["megapixels"] / seconds if seconds else 0.0
+
+    def classify(self, images, detections, stream_ids=None, batch_size=None):
+        t0 = time.perf_counter()
+        if stream_ids is None:
+            stream_ids = [None] * len(images)
+        # Собираем все валидные ROI всех кадров, чтобы классифицировать их одним батчем.
+        # С трекингом ROI классифицируются только для треков с устаревшим результатом.
+        # Пороги могут смениться из GUI во время обработки — фиксируем их на весь кадр
+        good_threshold, defect_threshold = self.good_threshold, self.defect_threshold
+        # Объект с уверенностью ниже обоих порогов всё равно будет отфильтрован —
+        # отсекаем его до вырезания ROI и классификации
+        min_obj_conf = min(good_threshold, defect_threshold)
+        routing = self.classifier_routing
+        classifiers = self.classifiers
+
+        candidates = []
+        rois = {}
+        to_classify = {}
+        for pos, (image, frame_dets) in enumerate(zip(images, detections)):
+            frame_dets = [
+                det for det in frame_dets
+                if det[2] >= min_obj_conf and routing.get(det[1], "none") in classifiers
+            ]
+            tracks = self.tracker(stream_ids[pos]).update(frame_dets) if self.tracking_enabled else [None] * len(frame_dets)
+            for (bbox, obj_class_name, obj_conf), track in zip(frame_dets, tracks):
+                x1, y1, x2, y2 = bbox
+                roi = image[y1:y2, x1:x2]
+                if roi.size == 0 or roi.shape[0] < 10 or roi.shape[1] < 10:
+                    continue
+                candidates.append((pos, bbox, obj_class_name, obj_conf, track))
+                if track is None or self.trackers[stream_ids[pos]].needs_classification(track):
+                    name = routing[obj_class_name]
+                    to_classify.setdefault(name, []).append(len(candidates) - 1)
+                    rois.setdefault(name, []).append(roi)
+
+        predictions = [None] * len(candidates)
+        for name, indices in to_classify.items():
+            for idx, prediction in zip(indices, self.classify_rois(rois[name], classifiers[name], batch_size=batch_size)):
+                predictions[idx] = prediction
+                track = candidates[idx][4]
+                if track is not None:
+                    self.trackers[stream_ids[candidates[idx][0]]].store(track, prediction)
+        for idx, (_, _, _, _, track) in enumerate(candidates):
+            if predictions[idx] is None:
+                predictions[idx] = track.classification
+
+        results = [[] for _ in images]
+        for (pos, bbox, obj_class_name, obj_conf, track), (defect_class, defect_conf) in zip(candidates, predictions):
             # --- Фильтрация по good_threshold ---
             if "good" in defect_class:
-                if defect_conf < self.good_threshold or obj_conf < self.good_threshold:
+                if defect_conf < good_threshold or obj_conf < good_threshold:
                     continue  # Фильтруем, если хотя бы одна из вероятностей ниже good_threshold
             else:
-                if defect_conf < self.defect_threshold or obj_conf < self.defect_threshold:
+                if defect_conf < defect_threshold or obj_conf < defect_threshold:
                     continue  # Фильтруем, если хотя бы одна из вероятностей ниже defect_threshold
 
-            results.append({
-                'bbox': [x1, y1, x2, y2],
+            result = {
+                'bbox': bbox,
                 'object_class': obj_class_name,
                 'object_conf': obj_conf,
                 'defect_class': defect_class,
                 'defect_conf': defect_conf
-            })
+            }
+            if track is not None:
+                result['track_id'] = track.track_id
+            results[pos].append(result)
 
+        METRICS.observe("classify", (time.perf_counter() - t0) * 1000.0)
         return results
 
-    def draw_results(self, image, results, draw_heatmap=False):
-        img = image.copy()
-        for res in results:
-            x1, y1, x2, y2 = res['bbox']
-            label = f"{res['object_class']} ({res['object_conf']:.2f})"
-            label2 = f"{res['defect_class']} ({res['defect_conf']:.2f})"
-            is_defect = "good" not in res['defect_class']
-            color = (0, 0, 255) if is_defect else (0, 255, 0)
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(img, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-            cv2.putText(img, label2, (x1, y2+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        if draw_heatmap:
-            overlay = img.copy()
-            for res in results:
-                x1, y1, x2, y2 = res['bbox']
-                alpha = min(0.5, max(0.1, res['object_conf']))
-                is_defect = "good" not in res['defect_class']
-                color = (0, 0, 255) if is_defect else (0, 255, 0)
-                cv2.rectangle(overlay, (x1, y1), (x2, y2), color, 2)
-                cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
-        return img
+    def classify_rois(self, rois, classifier=None, batch_size=None):
+        """Классифицирует список ROI батчами не больше batch_size (по умолчанию classifier_batch_size).
+        classifier — пара (модель, блокировка) из self.classifiers, по умолчанию основной.
+        Возвращает список (defect_class, defect_conf) в том же порядке."""
+        predictions = []
+        classifier, classifier_lock = classifier or (self.classifier, self._classifier_lock)
+        batch_size = batch_size or self.classifier_batch_size
+        for start in range(0, len(rois), batch_size):
+            batch = rois[start:start + batch_size]
+            with METRICS.timer("classifier"), classifier_lock:
+                cls_outs = classifier.predict(batch, device=self.device, verbose=False)
+                # У экспортированных моделей (ONNX/OpenVINO) имена классов доступны только через YOLO.names
+                names = classifier.names
+            for cls_out in cls_outs:
+                cls_probs = cls_out.probs.data.cpu().numpy()
+                cls_id = int(np.argmax(cls_probs))
+                defect_class = names[cls_id] if names else self.classifier_classes[cls_id]
+                predictions.append((defect_class, float(cls_probs[cls_id])))
+        return predictions
+
+    def draw_results(self, image, results, draw_heatmap=False, inplace=False):
+        with METRICS.timer("render"):
+            return self.renderer.render(image, results, draw_heatmap=draw_heatmap, inplace=inplace)
     
 if __name__ == '__main__':
     import argparse
@@ -119,6 +434,8 @@ if __name__ == '__main__':
     print("Результаты:")
     for r in results:
         print(r)
+    if engine.tiling_enabled:
+        print(f"Тайловая детекция: {engine.tiling_stats['tiles']} тайлов, {engine.tiling_throughput():.2f} Мп/с")
     img_vis = engine.draw_results(img, results, draw_heatmap=True)
     cv2.imwrite('result_vis.jpg', img_vis)
     print("Сохранено в result_vis.jpg")
\ No newline at end of file
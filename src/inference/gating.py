@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+GATING_METHODS = ("diff", "phash")
+
+
+class SceneChangeGate:
+    """Дешёвая проверка «изменилась ли сцена» перед полным проходом детектора.
+
+    Кадр уменьшается до маленького серого изображения и сравнивается с
+    последним кадром, на котором выполнялся полный проход:
+    diff  — средняя абсолютная разница яркости (0..255),
+    phash — число различающихся бит 64-битного difference hash.
+    Если отличие не превышает threshold, полный проход не нужен. Раз в
+    force_every кадров полный проход выполняется принудительно.
+    """
+
+    def __init__(self, threshold=3.0, force_every=30, method="diff", size=(64, 36)):
+        if method not in GATING_METHODS:
+            raise ValueError(f"Неизвестный метод гейтинга: {method}")
+        self.threshold = threshold
+        self.force_every = force_every
+        self.method = method
+        self.size = (9, 8) if method == "phash" else size
+        self.frames_total = 0
+        self.frames_skipped = 0
+        self._reference = None
+        self._since_full = 0
+
+    def _signature(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        if self.method == "phash":
+            return small[:, 1:] > small[:, :-1]
+        return small.astype(np.int16)
+
+    def _distance(self, sig):
+        if self.method == "phash":
+            return float(np.count_nonzero(sig != self._reference))
+        return float(np.mean(np.abs(sig - self._reference)))
+
+    def check(self, frame):
+        """True — нужен полный проход, False — можно переиспользовать предыдущий результат."""
+        self.frames_total += 1
+        sig = self._signature(frame)
+        if (
+            self._reference is None
+            or self._since_full + 1 >= self.force_every
+            or self._distance(sig) > self.threshold
+        ):
+            self._reference = sig
+            self._since_full = 0
+            return True
+        self._since_full += 1
+        self.frames_skipped += 1
+        return False
+
+    def reset(self):
+        self._reference = None
+        self._since_full = 0
+
+    def stats(self):
+        return {"frames_total": self.frames_total, "frames_skipped": self.frames_skipped}
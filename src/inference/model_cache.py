@@ -0,0 +1,59 @@
+import os
+import threading
+
+from inference.backends import INT8_BACKENDS, agreement_path, int8_path, load_model
+
+# Общий для процесса кэш моделей: ключ — (путь, версия файлов, задача, бэкенд, устройство, точность).
+# Несколько InferenceEngine с одинаковыми чекпоинтами используют одну копию модели.
+_cache = {}
+_loading = {}
+_lock = threading.Lock()
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def model_version(ckpt, backend, precision):
+    """mtime чекпоинта, а для int8 — ещё INT8-модели и отчёта согласия: после
+    quantize export/validate модель загружается заново без перезапуска."""
+    path = os.path.abspath(ckpt)
+    if precision != "int8" or backend not in INT8_BACKENDS:
+        return (_mtime(path),)
+    artifact = int8_path(path, backend)
+    return (_mtime(path), _mtime(artifact), _mtime(agreement_path(artifact)))
+
+
+def _cache_key(ckpt, task, backend, device, precision, min_agreement):
+    path = os.path.abspath(ckpt)
+    version = model_version(ckpt, backend, precision)
+    return (path, version, task, backend, str(device), precision, min_agreement)
+
+
+def get_model(ckpt, task, backend="torch", device="cpu", precision="fp32", min_agreement=0.98):
+    """Возвращает (model, lock). lock нужно держать на время predict —
+    предиктор Ultralytics не рассчитан на вызовы из нескольких потоков."""
+    key = _cache_key(ckpt, task, backend, device, precision, min_agreement)
+    with _lock:
+        if key in _cache:
+            return _cache[key]
+        key_lock = _loading.setdefault(key, threading.Lock())
+
+    # Загрузка одного и того же файла выполняется один раз, остальные потоки ждут
+    with key_lock:
+        with _lock:
+            if key in _cache:
+                return _cache[key]
+        entry = (load_model(ckpt, task, backend, precision, min_agreement), threading.Lock())
+        with _lock:
+            # Старые версии того же файла (другие mtime) больше не нужны
+            for old_key in [k for k in _cache if k[0] == key[0] and k[2:] == key[2:]]:
+                del _cache[old_key]
+            _cache[key] = entry
+            _loading.pop(key, None)
+    return entry
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+from utils.bounded_queue import BLOCK, DROP_OLDEST, BoundedQueue
+from utils.metrics import METRICS
+
+# Очереди названы по стадии-производителю: "capture" — кадры на детекцию,
+# "detect" — детекции на классификацию, "classify" — результаты на отрисовку
+QUEUES = ("capture", "detect", "classify")
+
+
+class StagedPipeline:
+    """Конвейер capture → detect → classify → render.
+
+    Каждая стадия работает в своём потоке и читает из своей ограниченной
+    очереди, поэтому детекция следующего кадра идёт параллельно с
+    классификацией и отрисовкой предыдущего. Стадии однопоточные и очереди
+    FIFO, так что кадры выходят в порядке frame_idx.
+
+    controller — необязательный LatencyBudgetController: задаёт imgsz детектора,
+    прореживание кадров и батч классификатора и получает задержку каждого кадра.
+
+    on_result(frame_idx, frame, results, vis, settings, source) вызывается из потока
+    отрисовки; settings — настройки контроллера, с которыми обработан кадр (или None),
+    source — словарь, переданный в put() вместе с кадром (номер и время в видео).
+    """
+
+    def __init__(self, engine, on_result, queue_sizes=None, drop_policies=None, draw_heatmap=True, controller=None):
+        self.engine = engine
+        self.on_result = on_result
+        self.draw_heatmap = draw_heatmap
+        self.controller = controller
+        queue_sizes = queue_sizes or {}
+        drop_policies = drop_policies or {}
+        self.queues = {
+            stage: BoundedQueue(
+                queue_sizes.get(stage, 2),
+                drop_policies.get(stage, DROP_OLDEST if stage == "capture" else BLOCK),
+            )
+            for stage in QUEUES
+        }
+        for stage, q in self.queues.items():
+            METRICS.register(f"queue_depth_{stage}", q.__len__)
+            METRICS.register(f"dropped_queue_{stage}", lambda q=q: q.dropped, kind="counter")
+        if controller is not None:
+            METRICS.register("budget_imgsz", lambda: controller.imgsz)
+            METRICS.register("budget_stride", lambda: controller.stride)
+            METRICS.register("skipped_stride", lambda: controller.frames_skipped, kind="counter")
+        self._running = False
+        self._threads = []
+        self._next_frame_idx = 0
+        self._last_emitted = -1
+
+    def put(self, frame, source=None):
+        # Время постановки в очередь — начало отсчёта задержки кадра для контроллера
+        return self.queues["capture"].put((time.perf_counter(), frame, source))
+
+    def start(self):
+        self._running = True
+        self._next_frame_idx = 0
+        self._last_emitted = -1
+        self.engine.reset_tracking()
+        for stage, target in (
+            ("detect", self._detect_worker),
+            ("classify", self._classify_worker),
+            ("render", self._render_worker),
+        ):
+            t = threading.Thread(target=target, name=f"pipeline-{stage}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._running = False
+        for q in self.queues.values():
+            q.close()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _stage_loop(self, in_queue, handler):
+        while self._running:
+            try:
+                item = in_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                handler(item)
+            except Exception as e:
+                print(f"Ошибка в конвейере ({threading.current_thread().name}): {e}")
+
+    def _detect_worker(self):
+        def handle(item):
+            t_put, frame, source = item
+            # Подмена моделей после reload_config — только на границе кадров
+            self.engine.swap_pending_models()
+            frame_idx = self._next_frame_idx
+            self._next_frame_idx += 1
+            settings = None
+            if self.controller is not None:
+                if not self.controller.admit(frame_idx):
+                    return
+                settings = self.controller.settings()
+            # Сцена не изменилась — детектор и классификатор пропускаются
+            cached = self.engine.gate_frame(frame)
+            if cached is not None:
+                self.queues["detect"].put((frame_idx, frame, None, cached, settings, t_put, source))
+                return
+            detections = self.engine.detect([frame], imgsz=settings["imgsz"] if settings else None)[0]
+            self.queues["detect"].put((frame_idx, frame, detections, None, settings, t_put, source))
+        self._stage_loop(self.queues["capture"], handle)
+
+    def _classify_worker(self):
+        def handle(item):
+            frame_idx, frame, detections, results, settings, t_put, source = item
+            num_rois = 0
+            if results is None:
+                batch_size = settings["classifier_batch_size"] if settings else None
+                results = self.engine.classify([frame], [detections], batch_size=batch_size)[0]
+                self.engine.remember_results(None, results)
+                num_rois = len(detections)
+            self.queues["classify"].put((frame_idx, frame, results, settings, t_put, num_rois, source))
+        self._stage_loop(self.queues["detect"], handle)
+
+    def _render_worker(self):
+        def handle(item):
+            frame_idx, frame, results, settings, t_put, num_rois, source = item
+            if frame_idx <= self._last_emitted:
+                return
+            vis = self.engine.draw_results(frame, results, draw_heatmap=self.draw_heatmap)
+            self._last_emitted = frame_idx
+            if self.controller is not None:
+                self.controller.update((time.perf_counter() - t_put) * 1000.0, num_rois)
+            self.on_result(frame_idx, frame, results, vis, settings, source)
+        self._stage_loop(self.queues["classify"], handle)
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from inference.backends import INT8_BACKENDS, agreement_path, int8_path, resolve_weights
+from inference.tracker import iou_matrix
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_IMGSZ = {"detect": 640, "classify": 224}
+
+
+def sample_images(images_dir, count, seed=0, exclude=()):
+    """До count изображений из images_dir; exclude — пути, которые не берутся (калибровочные)."""
+    exclude = {os.path.abspath(path) for path in exclude}
+    paths = []
+    for root, _, files in os.walk(images_dir):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMG_EXTS))
+    paths = sorted(path for path in paths if os.path.abspath(path) not in exclude)
+    if count and len(paths) > count:
+        paths = random.Random(seed).sample(paths, count)
+    return paths
+
+
+def calibration_path(artifact):
+    """Список калибровочных данных INT8-модели: validate исключает их из отложенной выборки."""
+    return artifact.rstrip("/\\") + ".calibration.json"
+
+
+def calibration_images(artifact):
+    """Изображения, на которых калибровалась INT8-модель (папка --data OpenVINO — все её файлы)."""
+    path = calibration_path(artifact)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        calibration = json.load(f)
+    images = list(calibration.get("images") or [])
+    data = calibration.get("data")
+    if data and os.path.isdir(data):
+        images.extend(sample_images(data, 0))
+    elif data:
+        print(f"Калибровка по {data}: пересечение с отложенной выборкой не проверяется")
+    return images
+
+
+def preprocess(path, task, imgsz):
+    """Вход ONNX-модели как у предобработки Ultralytics: letterbox для детектора,
+    resize + center crop для классификатора; RGB, 0..1, NCHW."""
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if task == "detect":
+        scale = min(imgsz / h, imgsz / w)
+        nw, nh = round(w * scale), round(h * scale)
+        canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        y0, x0 = (imgsz - nh) // 2, (imgsz - nw) // 2
+        canvas[y0:y0 + nh, x0:x0 + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        img = canvas
+    else:
+        scale = imgsz / min(h, w)
+        nw, nh = max(imgsz, round(w * scale)), max(imgsz, round(h * scale))
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        y0, x0 = (nh - imgsz) // 2, (nw - imgsz) // 2
+        img = img[y0:y0 + imgsz, x0:x0 + imgsz]
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+    return np.ascontiguousarray(img.transpose(2, 0, 1)[None])
+
+
+def _quantize_onnx(ckpt, task, images, imgsz):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    fp32_path = resolve_weights(ckpt, "onnxruntime")
+    out_path = int8_path(ckpt, "onnxruntime")
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(images)
+
+        def get_next(self):
+            for path in self._paths:
+                blob = preprocess(path, task, imgsz)
+                if blob is not None:
+                    return {input_name: blob}
+            return None
+
+    quantize_static(
+        fp32_path,
+        out_path,
+        Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+    )
+    # Ultralytics берёт имена классов, stride и imgsz из метаданных ONNX
+    src, dst = onnx.load(fp32_path), onnx.load(out_path)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, out_path)
+    return out_path
+
+
+def export_int8(ckpt, task, backend, data=None, images=None, imgsz=None, fraction=1.0):
+    """INT8-модель рядом с .pt. OpenVINO калибруется средствами Ultralytics
+    на датасете data (data.yaml детектора или папка классификатора),
+    ONNX Runtime — статической квантизацией на списке изображений."""
+    imgsz = imgsz or DEFAULT_IMGSZ[task]
+    t0 = time.time()
+    if backend == "openvino":
+        if not data:
+            raise ValueError("Для OpenVINO INT8 нужен --data (датасет для калибровки)")
+        path = YOLO(ckpt, task=task).export(
+            format="openvino", int8=True, data=data, fraction=fraction, imgsz=imgsz, dynamic=True
+        )
+    elif backend == "onnxruntime":
+        if not images:
+            raise ValueError("Для ONNX Runtime INT8 нужен --images (изображения для калибровки)")
+        path = _quantize_onnx(ckpt, task, images, imgsz)
+    else:
+        raise ValueError(f"INT8 поддерживается только для бэкендов: {', '.join(INT8_BACKENDS)}")
+    calibration = {
+        "data": os.path.abspath(data) if backend == "openvino" else None,
+        "images": [os.path.abspath(p) for p in images] if backend == "onnxruntime" else [],
+    }
+    with open(calibration_path(path), "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2, ensure_ascii=False)
+    print(f"INT8-модель сохранена: {path} ({time.time() - t0:.1f} с)")
+    return path
+
+
+def _detections(result):
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)
+
+
+def detection_agreement(ref, test, iou_threshold):
+    """Жадное сопоставление боксов одного класса. Возвращает (совпало, max(число боксов))."""
+    ref_boxes, ref_cls = ref
+    test_boxes, test_cls = test
+    total = max(len(ref_boxes), len(test_boxes))
+    if not len(ref_boxes) or not len(test_boxes):
+        return 0, total
+    ious = iou_matrix(ref_boxes, test_boxes)
+    ious[ref_cls[:, None] != test_cls[None, :]] = 0.0
+    matched = 0
+    # Не больше min(боксов) пар; нулевой IoU — пересечений не осталось (в том числе при --iou 0)
+    for _ in range(min(len(ref_boxes), len(test_boxes))):
+        i, j = np.unravel_index(np.argmax(ious), ious.shape)
+        if ious[i, j] <= 0 or ious[i, j] < iou_threshold:
+            break
+        matched += 1
+        ious[i, :] = 0.0
+        ious[:, j] = 0.0
+    return matched, total
+
+
+def validate_int8(ckpt, task, backend, images, imgsz=None, iou_threshold=0.5, device="cpu"):
+    """Сравнивает INT8 и fp32 на отложенной выборке и сохраняет отчёт
+    согласия, который проверяет InferenceEngine перед включением INT8.
+    Детектор: доля совпавших боксов (тот же класс, IoU >= iou_threshold);
+    классификатор: доля совпавших top-1 классов."""
+    imgsz = imgsz or DEFAULT_IMGSZ[task]
+    artifact = int8_path(ckpt, backend)
+    if not os.path.exists(artifact):
+        raise FileNotFoundError(f"Нет INT8-модели {artifact}, сначала выполните export")
+    fp32 = YOLO(resolve_weights(ckpt, backend), task=task)
+    int8 = YOLO(artifact, task=task)
+
+    matched = total = 0
+    for path in images:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        ref = fp32.predict(img, imgsz=imgsz, device=device, verbose=False)[0]
+        test = int8.predict(img, imgsz=imgsz, device=device, verbose=False)[0]
+        if task == "detect":
+            m, t = detection_agreement(_detections(ref), _detections(test), iou_threshold)
+        else:
+            m, t = int(ref.probs.top1 == test.probs.top1), 1
+        matched += m
+        total += t
+
+    report = {
+        "ckpt": ckpt,
+        "int8_model": artifact,
+        "task": task,
+        "backend": backend,
+        "images": len(images),
+        "compared": total,
+        "matched": matched,
+        "agreement": matched / total if total else 1.0,
+        "iou_threshold": iou_threshold if task == "detect" else None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(agreement_path(artifact), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def main(args):
+    if args.command == "export":
+        images = sample_images(args.images, args.count, args.seed) if args.images else None
+        export_int8(args.ckpt, args.task, args.backend, args.data, images, args.imgsz, args.fraction)
+        return
+
+    from utils.config import Config
+    min_agreement = args.min_agreement
+    if min_agreement is None:
+        min_agreement = float(Config(args.config).get("int8_min_agreement", 0.98))
+    # Отложенная выборка не пересекается с калибровочной, иначе согласие завышено
+    calibration = calibration_images(int8_path(args.ckpt, args.backend))
+    images = sample_images(args.images, args.count, args.seed, exclude=calibration) if args.images else []
+    if not images:
+        print(f"Нет изображений в {args.images}, не использованных при калибровке")
+        sys.exit(1)
+    report = validate_int8(args.ckpt, args.task, args.backend, images, args.imgsz, args.iou)
+    print(f"Согласие INT8 с fp32: {report['agreement']:.4f} ({report['matched']}/{report['compared']}), порог {min_agreement:.4f}")
+    if report["agreement"] < min_agreement:
+        print("INT8-модель не будет включена: согласие ниже порога")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="INT8-квантизация детектора и классификатора для CPU")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("export", "Собрать INT8-модель"), ("validate", "Сравнить INT8 с fp32 на отложенной выборке")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--ckpt', type=str, required=True, help='Исходный .pt')
+        p.add_argument('--task', choices=['detect', 'classify'], required=True)
+        p.add_argument('--backend', choices=list(INT8_BACKENDS), default='openvino')
+        p.add_argument('--images', type=str, default=None, help='Папка с изображениями InsPLAD')
+        p.add_argument('--count', type=int, default=300, help='Сколько изображений взять из --images')
+        p.add_argument('--seed', type=int, default=0)
+        p.add_argument('--imgsz', type=int, default=None, help='По умолчанию 640 для detect, 224 для classify')
+    export = sub.choices["export"]
+    export.add_argument('--data', type=str, default=None, help='Датасет калибровки для OpenVINO (data.yaml или папка классов)')
+    export.add_argument('--fraction', type=float, default=1.0, help='Доля датасета для калибровки OpenVINO')
+    validate = sub.choices["validate"]
+    validate.add_argument('--iou', type=float, default=0.5, help='IoU совпадения боксов детектора')
+    validate.add_argument('--min_agreement', type=float, default=None, help='По умолчанию int8_min_agreement из конфига')
+    validate.add_argument('--config', type=str, default='config.json')
+    args = parser.parse_args()
+    main(args)
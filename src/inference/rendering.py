@@ -0,0 +1,72 @@
+import collections
+
+import cv2
+import numpy as np
+
+DEFECT_COLOR = (0, 0, 255)
+GOOD_COLOR = (0, 255, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+THICKNESS = 2
+
+
+class OverlayRenderer:
+    """Отрисовка результатов на кадре.
+
+    Подписи рендерятся в спрайты и кэшируются по тексту и цвету.
+    draw_heatmap оставлен для совместимости и ничего не рисует: полупрозрачные
+    контуры совпадали с непрозрачными рамками и не давали видимого эффекта.
+    """
+
+    def __init__(self, draw_text=True, text_cache_size=1024):
+        self.draw_text = draw_text
+        self.text_cache_size = text_cache_size
+        self._text_cache = collections.OrderedDict()
+
+    def _text_sprite(self, text, color):
+        key = (text, color)
+        sprite = self._text_cache.get(key)
+        if sprite is not None:
+            self._text_cache.move_to_end(key)
+            return sprite
+        (tw, th), baseline = cv2.getTextSize(text, FONT, FONT_SCALE, THICKNESS)
+        pad = THICKNESS
+        patch = np.zeros((th + baseline + 2 * pad, tw + 2 * pad, 3), dtype=np.uint8)
+        cv2.putText(patch, text, (pad, th + pad), FONT, FONT_SCALE, color, THICKNESS)
+        mask = patch.any(axis=2)
+        # Смещение левого верхнего угла спрайта относительно точки привязки putText
+        sprite = (patch, mask, -pad, -(th + pad))
+        self._text_cache[key] = sprite
+        if len(self._text_cache) > self.text_cache_size:
+            self._text_cache.popitem(last=False)
+        return sprite
+
+    def _put_text(self, img, text, org, color):
+        patch, mask, dx, dy = self._text_sprite(text, color)
+        x, y = org[0] + dx, org[1] + dy
+        h, w = patch.shape[:2]
+        H, W = img.shape[:2]
+        # Обрезка по границам кадра (как у cv2.putText)
+        sx0, sy0 = max(0, -x), max(0, -y)
+        sx1, sy1 = min(w, W - x), min(h, H - y)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return
+        region = img[y + sy0:y + sy1, x + sx0:x + sx1]
+        m = mask[sy0:sy1, sx0:sx1]
+        region[m] = patch[sy0:sy1, sx0:sx1][m]
+
+    def render(self, image, results, draw_heatmap=False, inplace=False):
+        img = image if inplace else image.copy()
+        if not results:
+            return img
+        for res in results:
+            x1, y1, x2, y2 = res['bbox']
+            is_defect = "good" not in res['defect_class']
+            color = DEFECT_COLOR if is_defect else GOOD_COLOR
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, THICKNESS)
+            if self.draw_text:
+                label = f"{res['object_class']} ({res['object_conf']:.2f})"
+                label2 = f"{res['defect_class']} ({res['defect_conf']:.2f})"
+                self._put_text(img, label, (x1, y1 - 10), color)
+                self._put_text(img, label2, (x1, y2 + 20), color)
+        return img
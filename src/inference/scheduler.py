@@ -0,0 +1,242 @@
+import collections
+import threading
+import time
+
+import cv2
+
+from utils.bounded_queue import BLOCK, DROP_NEWEST, DROP_OLDEST
+
+LIVE_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+
+def is_live_source(path_or_url):
+    return isinstance(path_or_url, int) or str(path_or_url).lower().startswith(LIVE_PREFIXES)
+
+
+class _Stream:
+    def __init__(self, stream_id, callback, max_queue, drop_policy):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Неизвестная политика сброса кадров: {drop_policy}")
+        self.stream_id = stream_id
+        self.callback = callback
+        self.max_queue = max(1, int(max_queue))
+        self.drop_policy = drop_policy
+        self.frames = collections.deque()
+        self.next_frame_idx = 0
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+
+
+class MultiStreamScheduler:
+    """Общий планировщик инференса для нескольких потоков.
+
+    Кадры всех потоков собираются в батчи и прогоняются через один
+    InferenceEngine (одна копия детектора и классификатора). Батч
+    набирается по кругу — не больше одного кадра от потока за проход,
+    поэтому быстрый поток не вытесняет медленные. У каждого потока своя
+    ограниченная очередь с политикой сброса drop_oldest / drop_newest или
+    block — без потерь: submit ждёт места (для видеофайлов).
+    """
+
+    def __init__(self, engine=None, config=None, max_batch=None, max_wait=0.005):
+        if engine is None:
+            from inference.engine import InferenceEngine
+            engine = InferenceEngine(config)
+        self.engine = engine
+        cfg = engine.config
+        self.max_batch = max(1, int(max_batch or (cfg.get("scheduler_max_batch", 8) if cfg else 8)))
+        self.default_queue_size = int(cfg.get("stream_queue_size", 2)) if cfg else 2
+        self.default_drop_policy = cfg.get("stream_drop_policy", DROP_OLDEST) if cfg else DROP_OLDEST
+        self.max_wait = max_wait
+        self._streams = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._running = False
+        self._drain = False
+        self._thread = None
+
+    def add_stream(self, stream_id, callback, max_queue=None, drop_policy=None):
+        """callback(stream_id, frame_idx, frame, results) вызывается из потока планировщика."""
+        stream = _Stream(
+            stream_id,
+            callback,
+            self.default_queue_size if max_queue is None else max_queue,
+            drop_policy or self.default_drop_policy,
+        )
+        with self._cond:
+            self._streams[stream_id] = stream
+
+    def remove_stream(self, stream_id):
+        with self._cond:
+            self._streams.pop(stream_id, None)
+        self.engine.reset_tracking(stream_id)
+
+    def submit(self, stream_id, frame):
+        """Ставит кадр в очередь потока. Возвращает False, если кадр сброшен."""
+        with self._cond:
+            stream = self._streams[stream_id]
+            frame_idx = stream.next_frame_idx
+            stream.next_frame_idx += 1
+            stream.submitted += 1
+            if stream.drop_policy == BLOCK:
+                while len(stream.frames) >= stream.max_queue and self._running:
+                    self._cond.wait(0.1)
+            if len(stream.frames) >= stream.max_queue:
+                stream.dropped += 1
+                if stream.drop_policy != DROP_OLDEST:
+                    return False
+                stream.frames.popleft()
+            stream.frames.append((frame_idx, frame))
+            self._cond.notify()
+            return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                sid: {
+                    "submitted": s.submitted,
+                    "processed": s.processed,
+                    "dropped": s.dropped,
+                    "queued": len(s.frames),
+                }
+                for sid, s in self._streams.items()
+            }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain=False):
+        """drain=True — перед остановкой обработать кадры, уже стоящие в очередях."""
+        with self._cond:
+            self._running = False
+            self._drain = drain
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _collect_batch(self):
+        # Круговой обход: за один проход берём максимум один кадр от каждого потока
+        batch = []
+        while len(batch) < self.max_batch:
+            taken = False
+            for stream in self._streams.values():
+                if stream.frames and len(batch) < self.max_batch:
+                    frame_idx, frame = stream.frames.popleft()
+                    batch.append((stream, frame_idx, frame))
+                    taken = True
+            if not taken:
+                break
+        # Ротация порядка потоков, чтобы первый поток не имел приоритета
+        if self._streams:
+            self._streams.move_to_end(next(iter(self._streams)))
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not any(s.frames for s in self._streams.values()):
+                    self._cond.wait(0.2)
+                if not self._running and not (self._drain and any(s.frames for s in self._streams.values())):
+                    break
+                # Короткое ожидание, чтобы успели подойти кадры других потоков
+                queued = sum(len(s.frames) for s in self._streams.values())
+                if queued < self.max_batch and self.max_wait > 0:
+                    self._cond.wait(self.max_wait)
+                batch = self._collect_batch()
+                # Место в очередях освободилось — будим submit с политикой block
+                self._cond.notify_all()
+            if not batch:
+                continue
+
+            images = [frame for _, _, frame in batch]
+            stream_ids = [stream.stream_id for stream, _, _ in batch]
+            try:
+                batch_results = self.engine.infer_batch(images, stream_ids)
+            except Exception as e:
+                print(f"Ошибка инференса батча: {e}")
+                continue
+            for (stream, frame_idx, frame), results in zip(batch, batch_results):
+                stream.processed += 1
+                try:
+                    stream.callback(stream.stream_id, frame_idx, frame, results)
+                except Exception as e:
+                    print(f"Ошибка обработчика потока {stream.stream_id}: {e}")
+
+
+class StreamReader(threading.Thread):
+    """Читает кадры из VideoCapture и отдаёт их в планировщик. Видеофайлы
+    читаются так быстро, как их принимает планировщик: поток файла нужно
+    добавлять с политикой block, иначе кадры будут сбрасываться."""
+
+    def __init__(self, scheduler, stream_id, source):
+        super().__init__(daemon=True)
+        self.scheduler = scheduler
+        self.stream_id = stream_id
+        self.source = source
+        self._running = True
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        if hasattr(cv2, "CAP_PROP_BUFFERSIZE"):
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        while self._running:
+            ret, frame = cap.read()
+            if not ret:
+                print(f"Поток {self.stream_id}: нет кадров, чтение остановлено")
+                break
+            self.scheduler.submit(self.stream_id, frame)
+        cap.release()
+
+    def stop(self):
+        self._running = False
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+    from utils.config import Config
+    parser = argparse.ArgumentParser(description="Одновременный анализ нескольких RTSP-потоков/видео")
+    parser.add_argument('sources', nargs='+', help='RTSP URL или пути к видео')
+    parser.add_argument('--config', type=str, default='config.json')
+    parser.add_argument('--output_dir', type=str, default=None, help='Сохранять покадровые результаты в JSONL по потокам')
+    parser.add_argument('--stats_interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    scheduler = MultiStreamScheduler(config=Config(args.config))
+    writers = {}
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def on_result(stream_id, frame_idx, frame, results):
+        if stream_id in writers:
+            writers[stream_id].write(json.dumps({"frame_idx": frame_idx, "objects": results}, ensure_ascii=False) + "\n")
+
+    readers = []
+    for i, source in enumerate(args.sources):
+        stream_id = f"stream{i}"
+        if args.output_dir:
+            writers[stream_id] = open(os.path.join(args.output_dir, f"{stream_id}_results.jsonl"), "w", encoding="utf-8")
+        # Файлы — без потерь кадров (block), живые потоки — только свежие кадры
+        scheduler.add_stream(stream_id, on_result, drop_policy=None if is_live_source(source) else BLOCK)
+        readers.append(StreamReader(scheduler, stream_id, source))
+    scheduler.start()
+    for reader in readers:
+        reader.start()
+    try:
+        while any(r.is_alive() for r in readers):
+            time.sleep(args.stats_interval)
+            print(json.dumps(scheduler.stats(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        pass
+    for reader in readers:
+        reader.stop()
+    # Кадры, уже прочитанные из файлов, обрабатываются до конца
+    scheduler.stop(drain=True)
+    for f in writers.values():
+        f.close()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from inference.tracker import iou_matrix
+
+
+def _origins(length, tile, stride):
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile, stride))
+    # Последний тайл прижимаем к краю, чтобы все тайлы были одного размера
+    origins.append(length - tile)
+    return origins
+
+
+def make_tiles(image, tile_size, overlap):
+    """Режет кадр на перекрывающиеся тайлы tile_size x tile_size.
+    Возвращает список (x0, y0, тайл) — тайлы являются срезами без копирования."""
+    h, w = image.shape[:2]
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    return [
+        (x0, y0, image[y0:y0 + tile_size, x0:x0 + tile_size])
+        for y0 in _origins(h, tile_size, stride)
+        for x0 in _origins(w, tile_size, stride)
+    ]
+
+
+def nms(boxes, scores, iou_threshold):
+    """Жадный NMS, возвращает индексы оставленных боксов по убыванию score."""
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = iou_matrix(boxes[i:i + 1], boxes[order[1:]])[0]
+        order = order[1:][ious <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+def merge_detections(boxes, scores, classes, iou_threshold):
+    """NMS по классам для боксов, собранных со всех тайлов кадра."""
+    if len(boxes) == 0:
+        return np.array([], dtype=int)
+    # Сдвиг по классу: боксы разных классов не подавляют друг друга
+    offsets = classes[:, None].astype(np.float32) * (float(boxes.max()) + 1.0)
+    return nms(boxes + offsets, scores, iou_threshold)
@@ -0,0 +1,104 @@
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU между всеми парами боксов [x1, y1, x2, y2]: матрица len(a) x len(b)."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class Track:
+    __slots__ = ("track_id", "bbox", "object_class", "missed", "classification", "cls_bbox", "frames_since_cls")
+
+    def __init__(self, track_id, bbox, object_class):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.object_class = object_class
+        self.missed = 0
+        self.classification = None  # (defect_class, defect_conf)
+        self.cls_bbox = None
+        self.frames_since_cls = 0
+
+
+class IoUTracker:
+    """Простой IoU-трекер: жадное сопоставление детекций с треками одного класса.
+
+    Для каждого трека хранится последний результат классификатора. Повторная
+    классификация нужна раз в refresh_interval кадров или когда бокс заметно
+    изменился (IoU с боксом на момент классификации ниже reclassify_iou).
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=10, refresh_interval=15, reclassify_iou=0.6):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.reclassify_iou = reclassify_iou
+        self.tracks = []
+        self._next_id = 1
+
+    def reset(self):
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections):
+        """detections: список (bbox, object_class, object_conf).
+        Возвращает список треков в том же порядке, что и детекции."""
+        assigned = [None] * len(detections)
+        matched_tracks = set()
+        if self.tracks and detections:
+            ious = iou_matrix([d[0] for d in detections], [t.bbox for t in self.tracks])
+            # Детекции и треки разных классов не сопоставляются
+            for i, det in enumerate(detections):
+                for j, track in enumerate(self.tracks):
+                    if det[1] != track.object_class:
+                        ious[i, j] = 0.0
+            # Не больше min(детекций, треков) пар; нулевой IoU — пересечений не осталось
+            for _ in range(min(len(detections), len(self.tracks))):
+                i, j = np.unravel_index(np.argmax(ious), ious.shape)
+                if ious[i, j] <= 0 or ious[i, j] < self.iou_threshold:
+                    break
+                assigned[i] = self.tracks[j]
+                matched_tracks.add(j)
+                ious[i, :] = 0.0
+                ious[:, j] = 0.0
+
+        survivors = []
+        for j, track in enumerate(self.tracks):
+            if j in matched_tracks:
+                track.missed = 0
+                track.frames_since_cls += 1
+                survivors.append(track)
+            else:
+                track.missed += 1
+                if track.missed <= self.max_age:
+                    survivors.append(track)
+
+        for i, det in enumerate(detections):
+            if assigned[i] is None:
+                track = Track(self._next_id, det[0], det[1])
+                self._next_id += 1
+                assigned[i] = track
+                survivors.append(track)
+            else:
+                assigned[i].bbox = det[0]
+        self.tracks = survivors
+        return assigned
+
+    def needs_classification(self, track):
+        if track.classification is None or track.frames_since_cls >= self.refresh_interval:
+            return True
+        return iou_matrix([track.bbox], [track.cls_bbox])[0, 0] < self.reclassify_iou
+
+    def store(self, track, classification):
+        track.classification = classification
+        track.cls_bbox = track.bbox
+        track.frames_since_cls = 0
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import cv2
+import numpy as np
+
+from utils.metrics import METRICS
+
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def decode_image(data):
+    if not data:
+        # imdecode на пустом буфере падает с исключением OpenCV, а не возвращает None
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Пустое изображение")
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Не удалось декодировать изображение")
+    return img
+
+
+class MicroBatcher:
+    """Собирает кадры одновременных запросов в батчи для infer_batch.
+
+    Батч уходит в движок, как только набралось max_batch кадров или с
+    первого кадра прошло max_wait секунд. Движок вызывается из одного
+    потока. Очередь ограничена max_queue кадрами: если места нет, запрос
+    сразу получает 503 вместо ожидания (обратное давление на клиентов).
+    """
+
+    def __init__(self, engine, max_batch=8, max_wait=0.01, max_queue=64):
+        self.engine = engine
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max(1, int(max_queue)))
+        self.batches = 0
+        self.frames = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="infer")
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, images):
+        """Результаты infer для списка кадров; все кадры запроса принимаются или отклоняются вместе."""
+        if len(images) > self.queue.maxsize:
+            # Такой запрос не поместится даже в пустую очередь — повтор не поможет
+            raise HTTPError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Слишком много кадров в запросе: {len(images)}, максимум {self.queue.maxsize}",
+            )
+        if self.queue.maxsize - self.queue.qsize() < len(images):
+            METRICS.count("server_rejected")
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Сервис перегружен, повторите позже", {"Retry-After": "1"})
+        loop = asyncio.get_running_loop()
+        futures = []
+        for image in images:
+            fut = loop.create_future()
+            self.queue.put_nowait((image, fut))
+            futures.append(fut)
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            images = [image for image, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.engine.infer_batch, images)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+class InferenceServer:
+    """HTTP/1.1 поверх asyncio.start_server, без внешних зависимостей.
+
+    POST /infer        — тело: байты JPEG/PNG; ответ: {"objects": [...]}
+    POST /infer_batch  — тело: {"images": [base64, ...]}; ответ: {"results": [[...], ...]}
+    GET  /health       — состояние и загруженные модели
+    GET  /metrics      — метрики в формате Prometheus
+    Результаты — те же словари, что возвращает InferenceEngine.infer.
+    """
+
+    def __init__(self, engine, batcher, max_body_bytes):
+        self.engine = engine
+        self.batcher = batcher
+        self.max_body_bytes = max_body_bytes
+        self.started = time.time()
+        METRICS.register("queue_depth_server", batcher.queue.qsize)
+        METRICS.register("server_batches", lambda: batcher.batches, kind="counter")
+        METRICS.register("server_frames", lambda: batcher.frames, kind="counter")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                keep_alive = await self._handle_request(head, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            # Клиент закрыл соединение или прислал слишком длинные заголовки
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, head, reader, writer):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Некорректная строка запроса"}, keep_alive=False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self.max_body_bytes:
+            self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Слишком большой запрос"}, keep_alive=False)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        try:
+            with METRICS.timer("server_request"):
+                status, payload = await self._route(method, path.split("?", 1)[0], headers, body)
+            self._respond(writer, status, payload, keep_alive=keep_alive)
+        except HTTPError as e:
+            self._respond(writer, e.status, {"error": str(e)}, keep_alive=keep_alive, headers=e.headers)
+        except Exception as e:
+            print(f"Ошибка обработки {method} {path}: {e}")
+            self._respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}, keep_alive=keep_alive)
+        return keep_alive
+
+    async def _route(self, method, path, headers, body):
+        if path == "/health" and method == "GET":
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "uptime_s": round(time.time() - self.started, 1),
+                "detector": self.engine.detector_ckpt,
+                "classifier": self.engine.classifier_ckpt,
+                "backend": self.engine.backend,
+                "device": str(self.engine.device),
+                "queue": self.batcher.queue.qsize(),
+                "max_queue": self.batcher.queue.maxsize,
+            }
+        if path == "/metrics" and method == "GET":
+            return HTTPStatus.OK, METRICS.to_prometheus()
+        if path == "/infer" and method == "POST":
+            if not body:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Пустое тело запроса")
+            image = await asyncio.get_running_loop().run_in_executor(None, decode_image, body)
+            objects, = await self.batcher.submit([image])
+            return HTTPStatus.OK, {"objects": objects}
+        if path == "/infer_batch" and method == "POST":
+            try:
+                encoded = json.loads(body)["images"]
+                blobs = [base64.b64decode(item, validate=True) for item in encoded]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'Ожидается JSON {"images": [base64, ...]}')
+            loop = asyncio.get_running_loop()
+            images = await asyncio.gather(*(loop.run_in_executor(None, decode_image, blob) for blob in blobs))
+            results = await self.batcher.submit(list(images))
+            return HTTPStatus.OK, {"results": results}
+        if path in ("/health", "/metrics", "/infer", "/infer_batch"):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Метод {method} не поддерживается для {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Неизвестный путь: {path}")
+
+    def _respond(self, writer, status, payload, keep_alive=True, headers=None):
+        if isinstance(payload, str):
+            data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            data, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{k}: {v}" for k, v in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+
+
+async def serve(args):
+    from inference.engine import InferenceEngine
+    from utils.config import Config
+
+    config = Config(args.config)
+    # Только в памяти: запросы независимы, поэтому трекинг и пропуск
+    # неизменившихся кадров выключены; метрики нужны для /metrics
+    config.config.update({"tracking_enabled": False, "gating_enabled": False, "metrics_enabled": True})
+    engine = InferenceEngine(config)
+
+    batcher = MicroBatcher(
+        engine,
+        max_batch=args.max_batch or config.get("server_max_batch", 8),
+        max_wait=(args.max_wait_ms if args.max_wait_ms is not None else config.get("server_max_wait_ms", 10)) / 1000.0,
+        max_queue=args.max_queue or config.get("server_max_queue", 64),
+    )
+    server_obj = InferenceServer(engine, batcher, int(config.get("server_max_body_mb", 32) * 2**20))
+    batcher.start()
+    host = args.host or config.get("server_host", "127.0.0.1")
+    port = args.port or config.get("server_port", 8765)
+    server = await asyncio.start_server(server_obj.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Сервис инференса: http://{host}:{port} (POST /infer, /infer_batch; GET /health, /metrics)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def main(args):
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("Сервис остановлен")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис инференса с микробатчингом")
+    parser.add_argument('--config', type=str, default='config.json')
+    parser.add_argument('--host', type=str, default=None, help='По умолчанию server_host из конфига (127.0.0.1)')
+    parser.add_argument('--port', type=int, default=None, help='По умолчанию server_port из конфига (8765)')
+    parser.add_argument('--max_batch', type=int, default=None, help='Максимум кадров в батче')
+    parser.add_argument('--max_wait_ms', type=float, default=None, help='Сколько ждать добора батча, мс')
+    parser.add_argument('--max_queue', type=int, default=None, help='Кадров в очереди, сверх — ответ 503')
+    args = parser.parse_args()
+    main(args)
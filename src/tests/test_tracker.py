@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from inference.tracker import IoUTracker, iou_matrix
+
+
+def test_iou_matrix():
+    ious = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    assert ious.shape == (1, 3)
+    assert ious[0, 0] == pytest.approx(1.0)
+    assert ious[0, 1] == pytest.approx(50 / 150)
+    assert ious[0, 2] == 0.0
+
+
+def test_track_kept_for_overlapping_box():
+    tracker = IoUTracker(iou_threshold=0.3)
+    first, = tracker.update([([0, 0, 10, 10], "yoke", 0.9)])
+    second, = tracker.update([([1, 0, 11, 10], "yoke", 0.9)])
+    assert second is first
+    assert second.bbox == [1, 0, 11, 10]
+
+
+def test_different_class_gets_new_track():
+    tracker = IoUTracker(iou_threshold=0.3)
+    first, = tracker.update([([0, 0, 10, 10], "yoke", 0.9)])
+    second, = tracker.update([([0, 0, 10, 10], "spacer", 0.9)])
+    assert second.track_id != first.track_id
+
+
+def test_zero_threshold_with_disjoint_boxes_terminates():
+    tracker = IoUTracker(iou_threshold=0.0)
+    tracker.update([([0, 0, 10, 10], "yoke", 0.9), ([50, 50, 60, 60], "yoke", 0.9)])
+    tracks = tracker.update([([100, 100, 110, 110], "yoke", 0.9), ([200, 200, 210, 210], "yoke", 0.9)])
+    assert [t.track_id for t in tracks] == [3, 4]
+
+
+def test_lost_track_expires_after_max_age():
+    tracker = IoUTracker(max_age=1)
+    tracker.update([([0, 0, 10, 10], "yoke", 0.9)])
+    tracker.update([])
+    assert len(tracker.tracks) == 1
+    tracker.update([])
+    assert tracker.tracks == []
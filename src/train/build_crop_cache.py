@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+INDEX_FILE = "index.json"
+DEFAULT_DATA_DIR = 'InsPLAD-fault/supervised_fault_classification/defect_supervised/all_classes'
+# Как кроп приводится к size x size: crop — центральный квадрат (как
+# classify_transforms при валидации), letterbox — весь кроп с полями
+FIT_MODES = ("crop", "letterbox")
+PAD_VALUE = 114
+
+
+def list_split(split_dir, classes):
+    """Пары (путь, номер класса) для ImageNet-style папки split_dir/класс/файл."""
+    items = []
+    for label, cls_name in enumerate(classes):
+        cls_dir = os.path.join(split_dir, cls_name)
+        if not os.path.isdir(cls_dir):
+            continue
+        for name in sorted(os.listdir(cls_dir)):
+            if name.lower().endswith(IMG_EXTS):
+                items.append((os.path.join(cls_dir, name), label))
+    return items
+
+
+def load_crop(path, size, fit="crop"):
+    """Декодирование и приведение к size x size в RGB.
+    crop: уменьшение короткой стороны до size и центральный квадрат — как
+    Resize + CenterCrop при валидации. letterbox: длинная сторона до size,
+    края кропа сохраняются, остаток заполняется серым (PAD_VALUE)."""
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if fit == "letterbox":
+        scale = size / max(h, w)
+        nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+        y0, x0 = (size - nh) // 2, (size - nw) // 2
+        canvas[y0:y0 + nh, x0:x0 + nw] = cv2.resize(img, (nw, nh), interpolation=interpolation)
+        return cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+    scale = size / min(h, w)
+    nw, nh = max(size, round(w * scale)), max(size, round(h * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    img = cv2.resize(img, (nw, nh), interpolation=interpolation)
+    y0, x0 = (nh - size) // 2, (nw - size) // 2
+    return cv2.cvtColor(img[y0:y0 + size, x0:x0 + size], cv2.COLOR_BGR2RGB)
+
+
+def build_shard(items, images_path, labels_path, size, fit="crop"):
+    """Пишет кадры шарда прямо в memory-mapped .npy; нечитаемые файлы
+    получают метку -1 и пропускаются датасетом."""
+    images = np.lib.format.open_memmap(images_path, mode="w+", dtype=np.uint8, shape=(len(items), size, size, 3))
+    labels = np.full(len(items), -1, dtype=np.int16)
+    for i, (path, label) in enumerate(items):
+        crop = load_crop(path, size, fit)
+        if crop is None:
+            print(f"Не удалось прочитать: {path}")
+            continue
+        images[i] = crop
+        labels[i] = label
+    images.flush()
+    del images
+    np.save(labels_path, labels)
+    return int((labels >= 0).sum())
+
+
+def build_cache(data_dir, cache_dir, size=224, shard_size=1024, workers=None, splits=None, train_fit="crop"):
+    """train_fit — как приводится обучающая выборка. По умолчанию crop, как
+    при валидации и инференсе: поля letterbox модель видела бы только при
+    обучении. letterbox сохраняет края неквадратных объектов ценой такого
+    расхождения. Остальные выборки всегда crop — ровно то, что делает
+    classify_transforms при валидации."""
+    os.makedirs(cache_dir, exist_ok=True)
+    splits = splits or sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    # Порядок классов как у Ultralytics: отсортированные папки обучающей выборки
+    train_dir = os.path.join(data_dir, "train" if "train" in splits else splits[0])
+    classes = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+
+    index = {"size": size, "classes": classes, "splits": {}, "fit": {}}
+    tasks = []
+    for split in splits:
+        items = list_split(os.path.join(data_dir, split), classes)
+        fit = train_fit if split == "train" else "crop"
+        index["fit"][split] = fit
+        shards = []
+        for k, start in enumerate(range(0, len(items), shard_size)):
+            chunk = items[start:start + shard_size]
+            shard = {
+                "images": f"{split}_{k:04d}.npy",
+                "labels": f"{split}_{k:04d}_labels.npy",
+                "count": len(chunk),
+            }
+            shards.append(shard)
+            tasks.append((chunk, shard, fit))
+        index["splits"][split] = shards
+        print(f"{split}: {len(items)} изображений, шардов: {len(shards)}, приведение: {fit}")
+
+    t0 = time.time()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                build_shard,
+                chunk,
+                os.path.join(cache_dir, shard["images"]),
+                os.path.join(cache_dir, shard["labels"]),
+                size,
+                fit,
+            ): shard
+            for chunk, shard, fit in tasks
+        }
+        for fut in as_completed(futures):
+            futures[fut]["valid"] = fut.result()
+            done += futures[fut]["count"]
+            elapsed = max(time.time() - t0, 1e-6)
+            print(f"Готово {done} изображений ({done / elapsed:.1f} изобр./с)")
+
+    # Индекс пишется последним: его наличие означает, что кэш собран целиком
+    with open(os.path.join(cache_dir, INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    print(f"Кэш сохранён: {cache_dir} за {time.time() - t0:.1f} с")
+    return index
+
+
+class ShardedCropDataset:
+    """Датасет классификатора поверх шардов build_cache.
+
+    Шарды открываются через np.load(mmap_mode="r") лениво в каждом процессе
+    DataLoader, поэтому в воркеры не копируются сами массивы. Формат элемента
+    и атрибут torch_transforms — как у ultralytics ClassificationDataset.
+    """
+
+    def __init__(self, cache_dir, split, torch_transforms=None):
+        with open(os.path.join(cache_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if split not in index["splits"]:
+            raise ValueError(f"В кэше {cache_dir} нет выборки {split}: {list(index['splits'])}")
+        self.cache_dir = cache_dir
+        self.size = index["size"]
+        self.classes = index["classes"]
+        self.torch_transforms = torch_transforms
+        self._shard_files = [shard["images"] for shard in index["splits"][split]]
+        shard_ids, local_ids, labels = [], [], []
+        for k, shard in enumerate(index["splits"][split]):
+            shard_labels = np.load(os.path.join(cache_dir, shard["labels"]))
+            valid = np.flatnonzero(shard_labels >= 0)
+            shard_ids.append(np.full(len(valid), k, dtype=np.int32))
+            local_ids.append(valid.astype(np.int32))
+            labels.append(shard_labels[valid].astype(np.int64))
+        self.shard_ids = np.concatenate(shard_ids) if shard_ids else np.empty(0, np.int32)
+        self.local_ids = np.concatenate(local_ids) if local_ids else np.empty(0, np.int32)
+        self.labels = np.concatenate(labels) if labels else np.empty(0, np.int64)
+        self._shards = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def image(self, i):
+        if self._shards is None:
+            self._shards = [np.load(os.path.join(self.cache_dir, name), mmap_mode="r") for name in self._shard_files]
+        return self._shards[self.shard_ids[i]][self.local_ids[i]]
+
+    def __getitem__(self, i):
+        img = np.array(self.image(i))
+        if self.torch_transforms is not None:
+            from PIL import Image
+            img = self.torch_transforms(Image.fromarray(img))
+        return {"img": img, "cls": int(self.labels[i])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Кэш кропов классификатора: однократное декодирование в memory-mapped шарды")
+    parser.add_argument('--data_dir', type=str, default=DEFAULT_DATA_DIR, help='Выход coco2yolo_cls.py (split/класс/файл)')
+    parser.add_argument('--cache_dir', type=str, default='crop_cache', help='Куда сохранить шарды и index.json')
+    parser.add_argument('--size', type=int, default=224, help='Сторона квадратного кропа (обычно = img_size обучения)')
+    parser.add_argument('--shard_size', type=int, default=1024, help='Изображений в шарде')
+    parser.add_argument('--workers', type=int, default=None, help='Процессов (по умолчанию — число ядер)')
+    parser.add_argument('--splits', nargs='*', default=None, help='По умолчанию — все папки в data_dir')
+    parser.add_argument('--train_fit', choices=FIT_MODES, default='crop', help='Приведение обучающих кропов к квадрату (остальные выборки — crop)')
+    args = parser.parse_args()
+    build_cache(args.data_dir, args.cache_dir, args.size, args.shard_size, args.workers, args.splits, args.train_fit)
@@ -1,6 +1,41 @@
 import argparse
 import os
 from ultralytics import YOLO
+from ultralytics.data.augment import classify_augmentations, classify_transforms
+from ultralytics.models.yolo.classify import ClassificationTrainer
+
+from build_crop_cache import DEFAULT_DATA_DIR, ShardedCropDataset
+
+
+class CachedClassificationTrainer(ClassificationTrainer):
+    """Обучение на кэше build_crop_cache.py: изображения читаются из
+    memory-mapped шардов, JPEG не декодируются на каждой эпохе.
+
+    Аугментации применяются к кропам, уже уменьшенным до imgsz и приведённым
+    к квадрату так же, как при валидации (центральный квадрат; --train_fit
+    letterbox при сборке кэша сохраняет края), поэтому RandomResizedCrop
+    работает не с исходным разрешением, как при обучении на JPEG."""
+
+    cache_dir = None
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        split = "train" if mode == "train" else os.path.basename(os.path.normpath(img_path))
+        if mode == "train":
+            transforms = classify_augmentations(
+                size=self.args.imgsz,
+                scale=(1.0 - self.args.scale, 1.0),
+                hflip=self.args.fliplr,
+                vflip=self.args.flipud,
+                erasing=self.args.erasing,
+                auto_augment=self.args.auto_augment,
+                hsv_h=self.args.hsv_h,
+                hsv_s=self.args.hsv_s,
+                hsv_v=self.args.hsv_v,
+            )
+        else:
+            transforms = classify_transforms(size=self.args.imgsz)
+        return ShardedCropDataset(self.cache_dir, split, torch_transforms=transforms)
+
 
 def main(args):
     # Создаём директорию для чекпоинтов, если не существует
@@ -9,6 +44,11 @@ def main(args):
     # Загружаем модель для классификации (например, yolov8n-cls.pt)
     model = YOLO('yolo11n-cls.pt')  # или другой pretrain, если есть
 
+    trainer = None
+    if args.cache_dir:
+        CachedClassificationTrainer.cache_dir = args.cache_dir
+        trainer = CachedClassificationTrainer
+
     # Запускаем обучение через встроенный API Ultralytics
     model.train(
         data=args.data_dir,               # путь к директории с данными (ImageNet-style)
@@ -19,18 +59,21 @@ def main(args):
         device=args.device,
         project=args.checkpoint_dir,      # директория для чекпоинтов
         name='classifier',                # имя эксперимента (папка внутри project)
-        workers=4,                        # число потоков для загрузки данных
+        workers=args.workers,             # число потоков для загрузки данных
         exist_ok=True,                    # не ругаться если папка уже есть
+        trainer=trainer,                  # None — стандартная загрузка JPEG из data_dir
     )
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('--data_dir', type=str, default='InsPLAD-fault/supervised_fault_classification/defect_supervised', help='Путь к директории с классами')
+    parser.add_argument('--data_dir', type=str, default=DEFAULT_DATA_DIR, help='Путь к директории с классами (как у build_crop_cache.py)')
     parser.add_argument('--checkpoint_dir', type=str, default='checkpoints', help='Директория для чекпоинтов')
     parser.add_argument('--batch_size', type=int, default=32, help='Размер батча')
     parser.add_argument('--epochs', type=int, default=70, help='Число эпох')
     parser.add_argument('--lr', type=float, default=1e-3, help='Начальный learning rate')
     parser.add_argument('--img_size', type=int, default=224, help='Размер картинки (imgsz)')
     parser.add_argument('--device', type=str, default='cuda', help='cuda или cpu')
+    parser.add_argument('--workers', type=int, default=4, help='Число потоков загрузки данных')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Кэш кропов из build_crop_cache.py (data_dir нужен для списка классов)')
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,69 @@
+import collections
+import queue
+import threading
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+
+class BoundedQueue:
+    """Очередь фиксированного размера с политикой переполнения:
+    drop_oldest — вытеснить самый старый элемент,
+    drop_newest — отбросить новый,
+    block — ждать освобождения места (обратное давление на предыдущую стадию)."""
+
+    def __init__(self, maxsize, drop_policy=DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Неизвестная политика очереди: {drop_policy}")
+        self.maxsize = max(1, int(maxsize))
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """Возвращает False, если элемент (новый или вытесненный старый) был сброшен."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.drop_policy == BLOCK:
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait(0.1)
+                elif self.drop_policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                else:
+                    self._items.popleft()
+                    self.dropped += 1
+                    self._items.append(item)
+                    self._cond.notify_all()
+                    return False
+            if self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                raise queue.Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
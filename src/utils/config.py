@@ -5,8 +5,66 @@ DEFAULT_CONFIG = {
     "detector_ckpt": "checkpoints/detector/weights/best.pt",
     "classifier_ckpt": "checkpoints/classifier/weights/best.pt",
     "device": "cuda",
+    "backend": "torch",
+    "precision": "fp32",
+    "int8_min_agreement": 0.98,
     "defect_threshold": 0.7,
-    "good_threshold": 0.5
+    "good_threshold": 0.5,
+    "classifier_batch_size": 32,
+    "extra_classifier_ckpts": {},
+    "classifier_routing": {
+        "yoke suspension": "default",
+        "vari-grip": "default",
+        "polymer insulator upper shackle": "default",
+        "glass insulator": "default",
+        "lightning rod suspension": "default"
+    },
+    "render_text": True,
+    "scheduler_max_batch": 8,
+    "stream_queue_size": 2,
+    "stream_drop_policy": "drop_oldest",
+    "pipeline_queue_sizes": {"capture": 2, "detect": 2, "classify": 2},
+    "pipeline_drop_policies": {"capture": "drop_oldest", "detect": "block", "classify": "block"},
+    "tracking_enabled": False,
+    "track_iou_threshold": 0.3,
+    "track_max_age": 10,
+    "track_refresh_interval": 15,
+    "track_reclassify_iou": 0.6,
+    "gating_enabled": False,
+    "gating_method": "diff",
+    "gating_threshold": 3.0,
+    "gating_force_every": 30,
+    "tiling_enabled": False,
+    "tile_size": 640,
+    "tile_overlap": 0.2,
+    "tile_batch_size": 8,
+    "tile_nms_iou": 0.5,
+    "frame_store_budget_mb": 256,
+    "frame_store_format": "jpeg",
+    "frame_store_context_every": 0,
+    "sampler_mode": "all",
+    "sampler_every_n": 1,
+    "sampler_every_s": 1.0,
+    "sampler_seek_min_gap": 250,
+    "target_fps": 0,
+    "latency_budget_ms": 0,
+    "budget_imgsz_levels": [640, 512, 416, 320],
+    "budget_max_stride": 4,
+    "server_host": "127.0.0.1",
+    "server_port": 8765,
+    "server_max_batch": 8,
+    "server_max_wait_ms": 10,
+    "server_max_queue": 64,
+    "server_max_body_mb": 32,
+    "record_enabled": False,
+    "record_dir": "recordings",
+    "record_format": "mp4",
+    "record_fps": 0,
+    "record_queue_size": 32,
+    "record_drop_policy": "block",
+    "metrics_enabled": False,
+    "metrics_dump_path": "",
+    "metrics_dump_interval": 5.0
 }
 
 class Config:
@@ -0,0 +1,137 @@
+import cv2
+
+ALL = "all"
+NTH = "nth"
+SECONDS = "seconds"
+KEYFRAMES = "keyframes"
+MODES = (ALL, NTH, SECONDS, KEYFRAMES)
+
+# Типичный интервал ключевых кадров (keyint x264). Пропуск короче —
+# дешевле пройти grab(), длиннее — позиционированием на кадр
+DEFAULT_SEEK_MIN_GAP = 250
+
+
+def timestamp_ms(cap, frame_idx, fps):
+    """Время захваченного кадра в источнике, мс (по номеру кадра, если бэкенд не знает время)."""
+    ts = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if ts <= 0 and frame_idx > 0 and fps > 0:
+        ts = frame_idx * 1000.0 / fps
+    return float(max(ts, 0.0))
+
+
+def keyframes_supported(video_path):
+    """Сообщает ли бэкенд признак ключевого кадра: первый кадр файла всегда ключевой."""
+    key_prop = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+    if key_prop is None:
+        return False
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.grab() and cap.get(key_prop) > 0
+    finally:
+        cap.release()
+
+
+def source_info(frame_idx, ts_ms):
+    """Поля результата кадра с его положением в исходном видео."""
+    return {"source_frame_idx": frame_idx, "timestamp_ms": round(ts_ms, 1)}
+
+
+class FrameSampler:
+    """Прореживание видео до декодирования кадров.
+
+    Режимы: all — каждый кадр; nth — каждый every_n-й; seconds — кадр раз
+    в every_s секунд; keyframes — только ключевые кадры (признак пакета
+    CAP_PROP_LRF_HAS_KEY_FRAME бэкенда FFmpeg; без него — как seconds).
+    Ненужные кадры проходятся cap.grab() без retrieve(): без перевода в BGR
+    и копирования. Пропуск длиннее seek_min_gap кадров в файле делается
+    позиционированием (CAP_PROP_POS_FRAMES), и промежуточные группы кадров
+    не декодируются вовсе. Шаг nth/seconds отсчитывается от начала видео,
+    поэтому фрагменты batch_process выбирают те же кадры, что и целый прогон.
+    """
+
+    def __init__(self, mode=ALL, every_n=1, every_s=1.0, seek_min_gap=DEFAULT_SEEK_MIN_GAP):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим прореживания: {mode} (допустимы: {', '.join(MODES)})")
+        self.mode = mode
+        self.every_n = max(1, int(every_n))
+        self.every_s = max(1e-3, float(every_s))
+        self.seek_min_gap = max(1, int(seek_min_gap))
+        self.frames_sampled = 0
+        self.frames_skipped = 0
+        self.seeks = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("sampler_mode", ALL),
+            every_n=config.get("sampler_every_n", 1),
+            every_s=config.get("sampler_every_s", 1.0),
+            seek_min_gap=config.get("sampler_seek_min_gap", DEFAULT_SEEK_MIN_GAP),
+        )
+
+    def _step(self, mode, fps):
+        """Шаг в кадрах между выбранными кадрами; None — выбор по времени кадра."""
+        if mode == NTH:
+            return self.every_n
+        if mode == SECONDS:
+            return max(1, round(self.every_s * fps)) if fps > 0 else None
+        return 1
+
+    def positions(self, cap, fps=0.0, start=0, end=None, seekable=True):
+        """Генератор (source_frame_idx, timestamp_ms) выбранных кадров [start, end).
+
+        К моменту выдачи кадр уже захвачен cap.grab(): вызывающий код
+        декодирует его cap.retrieve() или пропускает, если кадр не нужен.
+        seekable=False — живой поток: только последовательный grab().
+        """
+        fps = fps if 0 < fps < 1000 else 0.0
+        mode = self.mode
+        key_prop = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+        if mode == KEYFRAMES and key_prop is None:
+            print("OpenCV не сообщает ключевые кадры, прореживание по времени")
+            mode = SECONDS
+        step = self._step(mode, fps)
+
+        idx = start
+        next_idx = -(-start // step) * step if step else start
+        next_ts = None
+        if seekable and start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        while end is None or idx < end:
+            if seekable and next_idx - idx >= self.seek_min_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, next_idx)
+                self.seeks += 1
+                idx = next_idx
+                if end is not None and idx >= end:
+                    return
+            if not cap.grab():
+                return
+            ts = timestamp_ms(cap, idx, fps)
+            if mode == KEYFRAMES:
+                selected = cap.get(key_prop) > 0
+                if not selected and idx == 0:
+                    # Первый кадр файла всегда ключевой — бэкенд признак не поддерживает
+                    print("Бэкенд видео не сообщает ключевые кадры, прореживание по времени")
+                    mode, step = SECONDS, self._step(SECONDS, fps)
+                    selected = True
+            elif step is None:
+                selected = next_ts is None or ts >= next_ts
+            else:
+                selected = idx >= next_idx
+            if selected:
+                self.frames_sampled += 1
+                yield idx, ts
+                if step is None:
+                    next_ts = ts + self.every_s * 1000.0
+                else:
+                    next_idx = idx + step
+            else:
+                self.frames_skipped += 1
+            idx += 1
+
+    def frames(self, cap, fps=0.0, start=0, end=None, seekable=True):
+        """Генератор (source_frame_idx, timestamp_ms, frame) с декодированием только выбранных кадров."""
+        for idx, ts in self.positions(cap, fps, start, end, seekable):
+            ret, frame = cap.retrieve()
+            if ret:
+                yield idx, ts, frame
@@ -0,0 +1,85 @@
+import collections
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+SPILL_FORMATS = ("jpeg", "npy")
+
+
+class FrameStore:
+    """Хранилище кадров для отчёта с ограничением по памяти.
+
+    Сохраняются только кадры с дефектами (и, если задано context_every,
+    каждый N-й кадр для контекста). Пока суммарный объём в памяти не
+    превышает memory_budget_mb, кадры лежат в RAM; самые старые сверх
+    бюджета сбрасываются во временную папку — в JPEG или в .npy, который
+    потом читается через memmap. Кадры выдаются по frame_idx через get().
+    """
+
+    def __init__(self, memory_budget_mb=256, spill_format="jpeg", context_every=0, jpeg_quality=90):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"Неизвестный формат хранения кадров: {spill_format}")
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.spill_format = spill_format
+        self.context_every = context_every
+        self.jpeg_quality = jpeg_quality
+        self._memory = collections.OrderedDict()
+        self._spilled = {}
+        self._memory_bytes = 0
+        self._spill_dir = None
+
+    def add(self, frame_idx, frame, has_defect):
+        """Возвращает True, если кадр сохранён."""
+        if not has_defect and not (self.context_every and frame_idx % self.context_every == 0):
+            return False
+        if frame_idx in self._memory:
+            self._memory_bytes -= self._memory[frame_idx].nbytes
+        self._spilled.pop(frame_idx, None)
+        self._memory[frame_idx] = frame
+        self._memory_bytes += frame.nbytes
+        while self._memory_bytes > self.memory_budget and self._memory:
+            self._spill_oldest()
+        return True
+
+    def _spill_oldest(self):
+        frame_idx, frame = self._memory.popitem(last=False)
+        self._memory_bytes -= frame.nbytes
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="inspl_frames_")
+        if self.spill_format == "jpeg":
+            path = os.path.join(self._spill_dir, f"{frame_idx:08d}.jpg")
+            cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        else:
+            path = os.path.join(self._spill_dir, f"{frame_idx:08d}.npy")
+            np.save(path, frame)
+        self._spilled[frame_idx] = path
+
+    def get(self, frame_idx, default=None):
+        if frame_idx in self._memory:
+            return self._memory[frame_idx]
+        path = self._spilled.get(frame_idx)
+        if path is None:
+            return default
+        if self.spill_format == "jpeg":
+            return cv2.imread(path)
+        return np.load(path, mmap_mode="r")
+
+    def __contains__(self, frame_idx):
+        return frame_idx in self._memory or frame_idx in self._spilled
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def clear(self):
+        self._memory.clear()
+        self._spilled.clear()
+        self._memory_bytes = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def __del__(self):
+        self.clear()
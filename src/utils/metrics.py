@@ -0,0 +1,238 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Границы корзин гистограмм задержек, мс
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+FPS_WINDOW_S = 2.0
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Оценка квантиля по верхней границе корзины."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max,
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "t0")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.t0) * 1000.0)
+        return False
+
+
+class Metrics:
+    """Счётчики производительности: гистограммы задержек по стадиям, FPS,
+    глубина очередей и сброшенные кадры.
+
+    Выключенный экземпляр (enabled=False) ничего не записывает: timer()
+    возвращает общий пустой контекст, остальные методы выходят на первой
+    проверке. Глубина очередей и подобные величины регистрируются функциями
+    (register) и опрашиваются только при снятии снимка.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._sources = {}
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает накопленные значения; зарегистрированные функции остаются."""
+        with self._lock:
+            self.histograms = {}
+            self.counters = collections.Counter()
+            self._ticks = {}
+
+    def timer(self, stage):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, ms):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(ms)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+
+    def tick(self, name):
+        """Отметка события для расчёта FPS по скользящему окну."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            ticks = self._ticks.get(name)
+            if ticks is None:
+                ticks = self._ticks[name] = collections.deque(maxlen=1024)
+            ticks.append(now)
+
+    def register(self, name, fn, kind="gauge"):
+        """fn() вызывается при снятии снимка; kind — gauge или counter."""
+        with self._lock:
+            self._sources[name] = (fn, kind)
+
+    def fps(self, name):
+        now = time.monotonic()
+        with self._lock:
+            ticks = [t for t in self._ticks.get(name, ()) if now - t <= FPS_WINDOW_S]
+        if len(ticks) < 2:
+            return 0.0
+        return (len(ticks) - 1) / max(ticks[-1] - ticks[0], 1e-9)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {stage: hist.snapshot() for stage, hist in self.histograms.items()}
+            counters = dict(self.counters)
+            fps_names = list(self._ticks)
+            sources = dict(self._sources)
+        gauges = {}
+        for name, (fn, kind) in sources.items():
+            try:
+                value = fn()
+            except Exception:
+                continue
+            (counters if kind == "counter" else gauges)[name] = value
+        return {
+            "timestamp": time.time(),
+            "latency": histograms,
+            "fps": {name: self.fps(name) for name in fps_names},
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def to_prometheus(self, prefix="inspl"):
+        lines = []
+        with self._lock:
+            histograms = {stage: (hist.buckets, list(hist.counts), hist.sum, hist.count)
+                          for stage, hist in self.histograms.items()}
+        if histograms:
+            lines.append(f"# TYPE {prefix}_stage_latency_ms histogram")
+        for stage, (buckets, counts, total, n) in histograms.items():
+            cumulative = 0
+            for bound, c in zip(buckets, counts):
+                cumulative += c
+                lines.append(f'{prefix}_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_latency_ms_bucket{{stage="{stage}",le="+Inf"}} {n}')
+            lines.append(f'{prefix}_stage_latency_ms_sum{{stage="{stage}"}} {total:.3f}')
+            lines.append(f'{prefix}_stage_latency_ms_count{{stage="{stage}"}} {n}')
+        snap = self.snapshot()
+        if snap["fps"]:
+            lines.append(f"# TYPE {prefix}_fps gauge")
+        for name, value in snap["fps"].items():
+            lines.append(f'{prefix}_fps{{source="{name}"}} {value:.3f}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Короткая строка для строки состояния GUI."""
+        snap = self.snapshot()
+        parts = [f"{name}: {value:.1f} FPS" for name, value in snap["fps"].items()]
+        latency = ", ".join(f"{stage} {h['p50_ms']:.0f} мс" for stage, h in snap["latency"].items())
+        if latency:
+            parts.append(latency)
+        depths = [f"{name[len('queue_depth_'):]} {value}" for name, value in snap["gauges"].items()
+                  if name.startswith("queue_depth_")]
+        if depths:
+            parts.append("очереди: " + ", ".join(depths))
+        dropped = sum(value for name, value in snap["counters"].items() if name.startswith("dropped"))
+        parts.append(f"сброшено кадров: {dropped}")
+        return " | ".join(parts)
+
+
+class MetricsDumper(threading.Thread):
+    """Периодически сохраняет снимок метрик в файл: Prometheus-текст для
+    .prom/.txt, иначе JSON. Файл заменяется атомарно."""
+
+    def __init__(self, metrics, path, interval=5.0):
+        super().__init__(name="metrics-dumper", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = max(0.1, float(interval))
+        self._stop_event = threading.Event()
+
+    def dump(self):
+        if os.path.splitext(self.path)[1].lower() in (".prom", ".txt"):
+            text = self.metrics.to_prometheus()
+        else:
+            text = json.dumps(self.metrics.snapshot(), indent=2, ensure_ascii=False)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Ошибка записи метрик {self.path}: {e}")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.dump()
+
+
+# Общий для процесса набор метрик; включается из конфигурации (metrics_enabled)
+METRICS = Metrics()
@@ -1,11 +1,149 @@
+import io
 import os
-import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook
 from openpyxl.drawing.image import Image as XLImage
 from openpyxl.utils import get_column_letter
 import cv2
-import numpy as np
-import tempfile
+
+from utils.result_store import ResultStore
+
+REPORT_COLUMNS = [
+    "Кадр",
+    "Время в видео",
+    "Класс объекта",
+    "Достоверность объекта",
+    "Класс дефекта",
+    "Достоверность дефекта",
+    "Время в записи",
+    "Скриншот",
+]
+
+
+def is_defect_object(obj, defect_threshold=0.7):
+    return "good" not in obj["defect_class"] and obj["defect_conf"] >= defect_threshold
+
+
+def format_time(seconds):
+    if seconds is None:
+        return ""
+    return f"{int(seconds // 60):02d}:{seconds % 60:06.3f}"
+
+
+def frame_metrics(total_frames, defect_frames, defect_threshold):
+    return {
+        "Всего кадров": total_frames,
+        f"Кадров с дефектами (>={int(defect_threshold*100)}%)": defect_frames,
+        "Доля кадров с дефектами": f"{defect_frames / (total_frames or 1):.2%}",
+    }
+
+
+def summary_metrics(results_per_frame, defect_threshold=0.7):
+    """Сводные метрики по кадрам для листа «Метрики».
+    results_per_frame — список словарей по кадрам или ResultStore (считается векторно)."""
+    if isinstance(results_per_frame, ResultStore):
+        defect_frames = results_per_frame.defect_frame_count(defect_threshold)
+        return frame_metrics(len(results_per_frame), defect_frames, defect_threshold)
+    defect_frames = sum(
+        any(is_defect_object(obj, defect_threshold) for obj in frame["objects"])
+        for frame in results_per_frame
+    )
+    return frame_metrics(len(results_per_frame), defect_frames, defect_threshold)
+
+
+class StreamingReportWriter:
+    """Потоковая запись Excel-отчёта (openpyxl write-only).
+
+    Строки пишутся по мере поступления кадров через add_frame, поэтому
+    писатель можно держать открытым во время анализа. Скриншоты
+    уменьшаются и кодируются в JPEG в памяти только для кадров с
+    дефектами; временные файлы не создаются.
+    """
+
+    def __init__(self, report_path, defect_threshold=0.7, thumb_size=(360, 240), jpeg_quality=85):
+        self.report_path = report_path
+        self.defect_threshold = defect_threshold
+        self.thumb_size = thumb_size
+        self.jpeg_quality = jpeg_quality
+        self.total_frames = 0
+        self.defect_frames = 0
+        self._row = 1
+        self._img_col_letter = get_column_letter(REPORT_COLUMNS.index("Скриншот") + 1)
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("Sheet1")
+        # Для красоты: ширина колонки под картинки
+        self._ws.column_dimensions[self._img_col_letter].width = 24
+        self._ws.append(REPORT_COLUMNS)
+
+    def _thumbnail(self, image):
+        h, w = image.shape[:2]
+        scale = min(self.thumb_size[0] / w, self.thumb_size[1] / h, 1.0)
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        img = XLImage(io.BytesIO(buf.tobytes()))
+        img.height = 120
+        img.width = 180
+        return img
+
+    def add_frame(self, frame_result, frame_image=None, frame_idx=None, record_time=None):
+        """Добавляет строки по дефектам кадра. Возвращает число добавленных строк.
+        record_time — смещение кадра в видеозаписи (VideoRecorder), с.
+        Если известен номер кадра в исходном видео (source_frame_idx), в колонку
+        «Кадр» пишется он — при прореживании он отличается от frame_idx."""
+        if frame_idx is None:
+            frame_idx = frame_result.get("frame_idx", self.total_frames)
+        frame_idx = frame_result.get("source_frame_idx", frame_idx)
+        timestamp_ms = frame_result.get("timestamp_ms")
+        video_time = format_time(timestamp_ms / 1000.0) if timestamp_ms is not None else ""
+        self.total_frames += 1
+
+        # --- ФИЛЬТРАЦИЯ: только дефекты, только defect_conf >= defect_threshold ---
+        defect_objects = [
+            obj for obj in frame_result.get("objects", [])
+            if is_defect_object(obj, self.defect_threshold)
+        ]
+        if not defect_objects:
+            return 0  # Если дефектов нет — не добавляем строку
+        self.defect_frames += 1
+
+        # Картинка — только по первой строке кадра
+        if frame_image is not None:
+            try:
+                img = self._thumbnail(frame_image)
+                if img is not None:
+                    self._ws.add_image(img, f"{self._img_col_letter}{self._row + 1}")
+            except Exception as e:
+                print(f"Ошибка вставки изображения: {e}")
+
+        for obj in defect_objects:
+            self._ws.append([
+                frame_idx,
+                video_time,
+                obj["object_class"],
+                f'{obj["object_conf"]:.2f}',
+                obj["defect_class"],
+                f'{obj["defect_conf"]:.2f}',
+                format_time(record_time),
+                "",
+            ])
+            self._row += 1
+        return len(defect_objects)
+
+    def metrics(self):
+        return frame_metrics(self.total_frames, self.defect_frames, self.defect_threshold)
+
+    def close(self, extra_metrics=None):
+        # Метрики — отдельный лист
+        if extra_metrics:
+            ws2 = self._wb.create_sheet("Метрики")
+            for k, v in extra_metrics.items():
+                ws2.append([k, v])
+        self._wb.save(self.report_path)
+        print(f"Отчёт сохранён: {self.report_path}")
+        return self.report_path
+
 
 class ReportGenerator:
     def __init__(self, report_dir="reports"):
@@ -18,12 +156,15 @@ class ReportGenerator:
         video_name="video",
         frame_images=None,
         extra_metrics=None,
+        frame_times=None,
     ):
         """
-        results_per_frame: список словарей по кадрам
+        results_per_frame: список словарей по кадрам или ResultStore
             [
                 {
                     'frame_idx': int,
+                    'source_frame_idx': int,  # необязательно: номер и время кадра в видео
+                    'timestamp_ms': float,
                     'objects': [
                         {
                             'bbox': [x1, y1, x2, y2],
@@ -37,111 +178,48 @@ class ReportGenerator:
                 },
                 ...
             ]
-        frame_images: список numpy.ndarray (BGR) — скриншоты соответствующих кадров
+        frame_images: список numpy.ndarray (BGR) — скриншоты соответствующих кадров,
+            либо хранилище с доступом по frame_idx (FrameStore) — кадры читаются по мере записи
         extra_metrics: dict — необязательные метрики (например, % кадров с дефектами)
+        frame_times: dict frame_idx -> смещение в видеозаписи, с (VideoRecorder.record_times)
         """
 
-        report_name = f"{video_name}_defect_report.xlsx"
-        report_path = os.path.join(self.report_dir, report_name)
-
-        rows = []
-        img_files = []
-
+        writer = self.open_stream(video_name)
+        if isinstance(results_per_frame, ResultStore):
+            # В отчёт попадают только дефекты: отбираем их маской по всем детекциям
+            # сразу и восстанавливаем словари только для кадров с дефектами
+            mask = results_per_frame.defect_mask(writer.defect_threshold)
+            # Список скриншотов идёт в порядке кадров хранилища: позиция по frame_idx
+            positions = (
+                {frame_idx: pos for pos, frame_idx in enumerate(results_per_frame.frames["frame_idx"].tolist())}
+                if frame_images is not None and not hasattr(frame_images, "get") else {}
+            )
+            for frame in results_per_frame.iter_frames(mask):
+                img = self._frame_image(frame_images, frame["frame_idx"], positions.get(frame["frame_idx"]))
+                record_time = frame_times.get(frame["frame_idx"]) if frame_times else None
+                writer.add_frame(frame, img, frame_idx=frame["frame_idx"], record_time=record_time)
+            writer.total_frames = len(results_per_frame)
+            return writer.close(extra_metrics)
         for idx, frame in enumerate(results_per_frame):
             frame_idx = frame.get("frame_idx", idx)
-            objects = frame.get("objects", [])
-            img = None
-            if frame_images is not None and idx < len(frame_images):
-                img = frame_images[idx]
-            img_file = None
-            if img is not None:
-                # Сохраним временный файл для вставки в Excel
-                fd, img_file = tempfile.mkstemp(suffix=".jpg")
-                os.close(fd)
-                cv2.imwrite(img_file, img)
-                img_files.append(img_file)
-
-            # --- ФИЛЬТРАЦИЯ: только дефекты, только defect_conf >= 0.7 ---
-            defect_objects = [
-                obj for obj in objects
-                if "good" not in obj["defect_class"] and obj["defect_conf"] >= 0.7
-            ]
-
-            if not defect_objects:
-                continue  # Если дефектов нет — не добавляем строку
-
-            for obj in defect_objects:
-                rows.append(
-                    {
-                        "Кадр": frame_idx,
-                        "Класс объекта": obj["object_class"],
-                        "Достоверность объекта": f'{obj["object_conf"]:.2f}',
-                        "Класс дефекта": obj["defect_class"],
-                        "Достоверность дефекта": f'{obj["defect_conf"]:.2f}',
-                        "Скриншот": img_file if img is not None else "",
-                    }
-                )
-
-        # DataFrame для отчёта
-        if rows:
-            df = pd.DataFrame(rows)
-        else:
-            # Если дефектов нет — создаём пустой DataFrame с нужными колонками
-            df = pd.DataFrame(
-                columns=[
-                    "Кадр",
-                    "Класс объекта",
-                    "Достоверность объекта",
-                    "Класс дефекта",
-                    "Достоверность дефекта",
-                    "Скриншот",
-                ]
-            )
-
-        # Сохраняем в Excel
-        df.to_excel(report_path, index=False, engine="openpyxl")
-
-        # Вставляем изображения в Excel (openpyxl)
-        wb = load_workbook(report_path)
-        ws = wb.active
-
-        img_col_idx = df.columns.get_loc("Скриншот") + 1
-        img_col_letter = get_column_letter(img_col_idx)
-
-        # Для красоты: ширина колонки под картинки
-        ws.column_dimensions[img_col_letter].width = 24
-
-        # Вставляем картинки (только по первой строке каждого кадра)
-        prev_frame = None
-        for i, row in enumerate(rows, start=2):  # openpyxl: первая строка — заголовки
-            img_path = row["Скриншот"]
-            frame = row["Кадр"]
-            if img_path and (frame != prev_frame or i == 2):
-                try:
-                    img = XLImage(img_path)
-                    img.height = 120
-                    img.width = 180
-                    cell = f"{img_col_letter}{i}"
-                    ws.add_image(img, cell)
-                except Exception as e:
-                    print(f"Ошибка вставки изображения: {e}")
-            prev_frame = frame
-
-        # Метрики — отдельный лист
-        if extra_metrics:
-            ws2 = wb.create_sheet("Метрики")
-            for idx, (k, v) in enumerate(extra_metrics.items(), start=1):
-                ws2[f"A{idx}"] = k
-                ws2[f"B{idx}"] = v
-
-        wb.save(report_path)
-
-        # Удаляем временные изображения
-        for f in img_files:
-            try:
-                os.remove(f)
-            except Exception:
-                pass
-
-        print(f"Отчёт сохранён: {report_path}")
-        return report_path
\ No newline at end of file
+            img = self._frame_image(frame_images, frame_idx, idx)
+            record_time = frame_times.get(frame_idx) if frame_times else None
+            writer.add_frame(frame, img, frame_idx=frame_idx, record_time=record_time)
+        return writer.close(extra_metrics)
+
+    @staticmethod
+    def _frame_image(frame_images, frame_idx, idx):
+        if frame_images is None:
+            return None
+        if hasattr(frame_images, "get"):
+            return frame_images.get(frame_idx)
+        if idx is not None and idx < len(frame_images):
+            return frame_images[idx]
+        return None
+
+    def open_stream(self, video_name="video", defect_threshold=0.7):
+        """Открывает потоковый отчёт: кадры добавляются через add_frame по ходу анализа,
+        файл записывается при close()."""
+        report_name = f"{video_name}_defect_report.xlsx"
+        report_path = os.path.join(self.report_dir, report_name)
+        return StreamingReportWriter(report_path, defect_threshold=defect_threshold)
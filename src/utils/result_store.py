@@ -0,0 +1,332 @@
+import json
+import os
+
+import numpy as np
+
+FRAME_DTYPE = np.dtype([
+    ("frame_idx", np.int64),
+    ("num_objects", np.int32),
+    # Настройки контроллера бюджета задержки для кадра; 0 — не записаны
+    ("imgsz", np.int16),
+    ("stride", np.int16),
+    ("classifier_batch_size", np.int16),
+    # Положение кадра в исходном видео (FrameSampler); -1 — неизвестно
+    ("source_frame_idx", np.int64),
+    ("timestamp_ms", np.float64),
+])
+SETTINGS_FIELDS = ("imgsz", "stride", "classifier_batch_size")
+SOURCE_FIELDS = ("source_frame_idx", "timestamp_ms")
+
+DETECTION_DTYPE = np.dtype([
+    ("frame_idx", np.int64),
+    ("x1", np.int32),
+    ("y1", np.int32),
+    ("x2", np.int32),
+    ("y2", np.int32),
+    ("object_class", np.int16),
+    ("object_conf", np.float32),
+    ("defect_class", np.int16),
+    ("defect_conf", np.float32),
+    ("track_id", np.int32),
+])
+
+# Ключ метаданных Parquet со списком кадров и их настройками (в таблице только детекции)
+PARQUET_FRAMES_KEY = b"inspl_frames"
+
+
+class _ChunkedArray:
+    """Структурированный массив, растущий блоками по chunk_size строк."""
+
+    def __init__(self, dtype, chunk_size=4096):
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self.clear()
+
+    def clear(self):
+        self._chunks = []
+        self._buf = np.empty(self.chunk_size, dtype=self.dtype)
+        self._n = 0
+        self._len = 0
+
+    def append(self, row):
+        if self._n == self.chunk_size:
+            self._chunks.append(self._buf)
+            self._buf = np.empty(self.chunk_size, dtype=self.dtype)
+            self._n = 0
+        self._buf[self._n] = row
+        self._n += 1
+        self._len += 1
+
+    def extend(self, rows):
+        if len(rows) == 0:
+            return
+        self.array()
+        self._chunks.append(np.asarray(rows, dtype=self.dtype))
+        self._len += len(rows)
+
+    def array(self):
+        """Все строки одним массивом; результат склейки сохраняется вместо блоков."""
+        if self._n or len(self._chunks) != 1:
+            parts = self._chunks + ([self._buf[:self._n].copy()] if self._n else [])
+            merged = np.concatenate(parts) if parts else np.empty(0, dtype=self.dtype)
+            self._chunks = [merged]
+            self._n = 0
+        return self._chunks[0]
+
+    def __len__(self):
+        return self._len
+
+
+def _frame_ranges(frame_idx):
+    """Сжатие списка номеров кадров в диапазоны [start, end) для метаданных."""
+    ranges = []
+    for idx in frame_idx.tolist():
+        if ranges and ranges[-1][1] == idx:
+            ranges[-1][1] = idx + 1
+        else:
+            ranges.append([idx, idx + 1])
+    return ranges
+
+
+def _upgrade_frames(frames):
+    """Кадры из файлов старых версий: недостающие поля — значения «не записано»."""
+    if frames.dtype == FRAME_DTYPE:
+        return frames
+    upgraded = np.zeros(len(frames), dtype=FRAME_DTYPE)
+    for name in SOURCE_FIELDS:
+        upgraded[name] = -1
+    for name in frames.dtype.names:
+        if name in FRAME_DTYPE.names:
+            upgraded[name] = frames[name]
+    return upgraded
+
+
+def _settings_changes(frames):
+    """Настройки кадров в виде [номер строки, imgsz, stride, батч] только там, где они меняются."""
+    values = np.stack([frames[name] for name in SETTINGS_FIELDS], axis=1) if len(frames) else np.empty((0, 3))
+    changed = np.ones(len(values), dtype=bool)
+    changed[1:] = (values[1:] != values[:-1]).any(axis=1)
+    return [[int(i)] + values[i].tolist() for i in np.flatnonzero(changed)]
+
+
+class ResultStore:
+    """Колоночное хранилище результатов анализа.
+
+    Вместо списка словарей по кадрам детекции лежат в структурированном
+    массиве NumPy (DETECTION_DTYPE), классы — номерами в словарях
+    object_classes / defect_classes. Кадры (в том числе без объектов)
+    хранятся отдельно (FRAME_DTYPE), детекции идут в порядке кадров.
+    Метрики и отбор дефектов считаются векторно; iter_frames() отдаёт
+    кадры в прежнем формате {'frame_idx', 'objects'} для совместимости.
+    """
+
+    def __init__(self, chunk_size=4096):
+        self._frames = _ChunkedArray(FRAME_DTYPE, chunk_size)
+        self._detections = _ChunkedArray(DETECTION_DTYPE, chunk_size)
+        self.clear()
+
+    def clear(self):
+        self._frames.clear()
+        self._detections.clear()
+        self.object_classes = []
+        self.defect_classes = []
+        self._class_ids = ({}, {})
+
+    def _class_id(self, kind, name):
+        ids = self._class_ids[kind]
+        class_id = ids.get(name)
+        if class_id is None:
+            names = self.object_classes if kind == 0 else self.defect_classes
+            class_id = ids[name] = len(names)
+            names.append(name)
+        return class_id
+
+    def append(self, frame_result):
+        frame_idx = frame_result.get("frame_idx", len(self._frames))
+        objects = frame_result.get("objects", [])
+        settings = frame_result.get("settings") or {}
+        self._frames.append(
+            (frame_idx, len(objects))
+            + tuple(settings.get(name, 0) for name in SETTINGS_FIELDS)
+            + tuple(frame_result.get(name, -1) for name in SOURCE_FIELDS)
+        )
+        for obj in objects:
+            x1, y1, x2, y2 = obj["bbox"]
+            self._detections.append((
+                frame_idx, x1, y1, x2, y2,
+                self._class_id(0, obj["object_class"]), obj["object_conf"],
+                self._class_id(1, obj["defect_class"]), obj["defect_conf"],
+                obj.get("track_id", -1),
+            ))
+
+    def extend(self, results_per_frame):
+        for frame_result in results_per_frame:
+            self.append(frame_result)
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def frames(self):
+        return self._frames.array()
+
+    @property
+    def detections(self):
+        return self._detections.array()
+
+    @property
+    def num_detections(self):
+        return len(self._detections)
+
+    # --- Векторные метрики ---
+
+    def defect_mask(self, defect_threshold=0.7):
+        """Маска детекций-дефектов (то же условие, что is_defect_object)."""
+        det = self.detections
+        is_good = np.array(["good" in name for name in self.defect_classes] or [False], dtype=bool)
+        return ~is_good[det["defect_class"]] & (det["defect_conf"] >= defect_threshold)
+
+    def defect_frame_count(self, defect_threshold=0.7):
+        det = self.detections
+        return int(np.unique(det["frame_idx"][self.defect_mask(defect_threshold)]).size)
+
+    # --- Совместимость со списком словарей ---
+
+    def _objects(self, rows):
+        objects = []
+        for row in rows:
+            obj = {
+                'bbox': [int(row["x1"]), int(row["y1"]), int(row["x2"]), int(row["y2"])],
+                'object_class': self.object_classes[row["object_class"]],
+                'object_conf': float(row["object_conf"]),
+                'defect_class': self.defect_classes[row["defect_class"]],
+                'defect_conf': float(row["defect_conf"]),
+            }
+            if row["track_id"] >= 0:
+                obj['track_id'] = int(row["track_id"])
+            objects.append(obj)
+        return objects
+
+    def iter_frames(self, mask=None):
+        """Кадры в формате {'frame_idx', 'objects'}. С маской детекций
+        отдаются только кадры, где осталась хотя бы одна выбранная детекция."""
+        frames, det = self.frames, self.detections
+        offsets = np.concatenate([[0], np.cumsum(frames["num_objects"])])
+        for i, frame_idx in enumerate(frames["frame_idx"].tolist()):
+            rows = det[offsets[i]:offsets[i + 1]]
+            if mask is not None:
+                rows = rows[mask[offsets[i]:offsets[i + 1]]]
+                if len(rows) == 0:
+                    continue
+            frame = {"frame_idx": frame_idx, "objects": self._objects(rows)}
+            if frames["source_frame_idx"][i] >= 0:
+                frame["source_frame_idx"] = int(frames["source_frame_idx"][i])
+                frame["timestamp_ms"] = float(frames["timestamp_ms"][i])
+            if frames["stride"][i] > 0:
+                frame["settings"] = {name: int(frames[name][i]) for name in SETTINGS_FIELDS}
+            yield frame
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    # --- Сохранение и загрузка ---
+
+    def save(self, path):
+        """Формат по расширению: .npz или .parquet."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npz":
+            np.savez_compressed(
+                path,
+                frames=self.frames,
+                detections=self.detections,
+                object_classes=np.array(self.object_classes, dtype=str),
+                defect_classes=np.array(self.defect_classes, dtype=str),
+            )
+        elif ext == ".parquet":
+            self._save_parquet(path)
+        else:
+            raise ValueError(f"Неизвестный формат хранилища результатов: {path}")
+        return path
+
+    def _save_parquet(self, path):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        det = self.detections
+        df = pd.DataFrame({name: det[name] for name in DETECTION_DTYPE.names})
+        # Словарное кодирование строк в Parquet — те же номера классов
+        df["object_class"] = pd.Categorical.from_codes(det["object_class"], categories=self.object_classes or [""])
+        df["defect_class"] = pd.Categorical.from_codes(det["defect_class"], categories=self.defect_classes or [""])
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        frames = self.frames
+        metadata = dict(table.schema.metadata or {})
+        frames_meta = {
+            "ranges": _frame_ranges(frames["frame_idx"]),
+            "settings": _settings_changes(frames),
+        }
+        if (frames["source_frame_idx"] >= 0).any():
+            frames_meta["source"] = {name: frames[name].tolist() for name in SOURCE_FIELDS}
+        metadata[PARQUET_FRAMES_KEY] = json.dumps(frames_meta).encode("utf-8")
+        pq.write_table(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npz":
+            with np.load(path) as data:
+                store.object_classes = data["object_classes"].tolist()
+                store.defect_classes = data["defect_classes"].tolist()
+                frames = _upgrade_frames(data["frames"])
+                detections = data["detections"]
+        elif ext == ".parquet":
+            frames, detections = store._load_parquet(path)
+        else:
+            raise ValueError(f"Неизвестный формат хранилища результатов: {path}")
+        store._class_ids = (
+            {name: i for i, name in enumerate(store.object_classes)},
+            {name: i for i, name in enumerate(store.defect_classes)},
+        )
+        store._frames.extend(frames)
+        store._detections.extend(detections)
+        return store
+
+    def _load_parquet(self, path):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        df = table.to_pandas()
+        detections = np.zeros(len(df), dtype=DETECTION_DTYPE)
+        for name in DETECTION_DTYPE.names:
+            if name in ("object_class", "defect_class") or name not in df:
+                continue
+            detections[name] = df[name].to_numpy()
+        if "track_id" not in df:
+            detections["track_id"] = -1
+        for name, classes in (("object_class", self.object_classes), ("defect_class", self.defect_classes)):
+            column = df[name].astype("category")
+            classes.extend(str(c) for c in column.cat.categories)
+            detections[name] = column.cat.codes.to_numpy()
+
+        meta = (table.schema.metadata or {}).get(PARQUET_FRAMES_KEY)
+        settings = []
+        source = None
+        if meta is not None:
+            meta = json.loads(meta)
+            source = meta.get("source")
+            settings = meta["settings"]
+            frame_idx = np.concatenate([np.arange(start, end) for start, end in meta["ranges"]] or [np.empty(0, np.int64)])
+        else:
+            # Файл без списка кадров (старые результаты batch_process): известны только кадры с детекциями
+            detections = detections[np.argsort(detections["frame_idx"], kind="stable")]
+            frame_idx = np.unique(detections["frame_idx"])
+        det_frames, counts = np.unique(detections["frame_idx"], return_counts=True)
+        frames = np.zeros(len(frame_idx), dtype=FRAME_DTYPE)
+        frames["frame_idx"] = frame_idx
+        for name in SOURCE_FIELDS:
+            frames[name] = source[name] if source else -1
+        frames["num_objects"][np.searchsorted(frame_idx, det_frames)] = counts
+        # Настройки действуют от строки изменения до следующего изменения
+        for (start, *values), nxt in zip(settings, settings[1:] + [[len(frames)]]):
+            for name, value in zip(SETTINGS_FIELDS, values):
+                frames[name][start:nxt[0]] = value
+        return frames, detections
@@ -0,0 +1,111 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from utils.bounded_queue import BLOCK, BoundedQueue
+from utils.report_generator import is_defect_object
+
+# Кодеки по расширению файла записи
+FOURCC_BY_EXT = {
+    ".mp4": "mp4v",
+    ".mkv": "XVID",
+    ".avi": "XVID",
+}
+
+
+def index_path(video_path):
+    return os.path.splitext(video_path)[0] + "_index.jsonl"
+
+
+class VideoRecorder:
+    """Запись размеченных кадров в видеофайл в отдельном потоке кодирования.
+
+    add() только кладёт кадр в ограниченную очередь (queue_size кадров,
+    политика drop_policy как у очередей конвейера); cv2.VideoWriter
+    открывается при первом add() по размеру кадра. Если запись открыть не
+    удалось, recorder помечается failed и add() возвращает False — кадры
+    нужно сохранять иначе (FrameStore). Рядом с
+    видео пишется индекс <имя>_index.jsonl: для каждого записанного кадра
+    frame_idx, смещение в записи, время от начала анализа и число дефектов —
+    по нему отчёт ссылается на время в записи вместо скриншотов.
+    """
+
+    def __init__(self, path, fps=25.0, queue_size=32, drop_policy=BLOCK, defect_threshold=0.7, fourcc=None):
+        self.path = path
+        self.fps = fps if fps and 0 < fps < 1000 else 25.0
+        self.defect_threshold = defect_threshold
+        ext = os.path.splitext(path)[1].lower()
+        self.fourcc = fourcc or FOURCC_BY_EXT.get(ext, "mp4v")
+        self.frames_written = 0
+        self.failed = False
+        # frame_idx -> смещение в записи, с (для ссылок из отчёта)
+        self.record_times = {}
+        self._queue = BoundedQueue(queue_size, drop_policy)
+        self._writer = None
+        self._index = None
+        self._open_lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="video-recorder", daemon=True)
+        self._running = True
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread.start()
+
+    @property
+    def frames_dropped(self):
+        return self._queue.dropped
+
+    def add(self, frame_idx, frame, results):
+        """Потокобезопасно; кадр не копируется — его нельзя изменять после вызова.
+        Возвращает False, если кадр не будет записан (запись не открылась или кадр сброшен)."""
+        if self._writer is None and not self.failed:
+            with self._open_lock:
+                if self._writer is None and not self.failed:
+                    self._open(frame)
+        if self.failed:
+            return False
+        defect_count = sum(is_defect_object(obj, self.defect_threshold) for obj in results)
+        return self._queue.put((frame_idx, frame, defect_count, time.monotonic() - self._t0))
+
+    def _open(self, frame):
+        h, w = frame.shape[:2]
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (w, h))
+        if not writer.isOpened():
+            print(f"Не удалось открыть запись {self.path} (кодек {self.fourcc})")
+            writer.release()
+            self.failed = True
+            return
+        self._index = open(index_path(self.path), "w", encoding="utf-8")
+        self._writer = writer
+
+    def _run(self):
+        while self._running or len(self._queue):
+            try:
+                frame_idx, frame, defect_count, wall_time = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._writer.write(frame)
+            record_time = self.frames_written / self.fps
+            self.record_times[frame_idx] = record_time
+            self._index.write(json.dumps({
+                "frame_idx": frame_idx,
+                "record_frame": self.frames_written,
+                "record_time_s": round(record_time, 3),
+                "wall_time_s": round(wall_time, 3),
+                "defect_count": defect_count,
+            }) + "\n")
+            self.frames_written += 1
+
+    def close(self):
+        """Дописывает очередь и закрывает файлы."""
+        self._running = False
+        self._thread.join()
+        self._queue.close()
+        if self._writer is not None:
+            self._writer.release()
+            self._index.close()
+            print(f"Запись сохранена: {self.path} ({self.frames_written} кадров, пропущено {self.frames_dropped})")
+        return self.path